@@ -8,6 +8,21 @@ class Settings(BaseSettings):
     REDIS_URL: str
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
+    # Seconds after which an in-process station reading is considered stale
+    LIVE_STATE_MAX_AGE_S: int = 1800
+    # Live updates are batched per city over this window before being emitted
+    LIVE_COALESCE_WINDOW_MS: int = 250
+    # Running several uvicorn workers / API nodes: share Socket.IO rooms through
+    # Redis and elect a single live-update emitter
+    MULTI_WORKER: bool = False
+    # /changes answers `since` values at most this many sequence numbers behind
+    # the head; older clients are told to resync
+    CHANGES_MAX_LAG: int = 50000
+    # Parquet cold tier written by data/archive_history.py (shared with the
+    # maintenance service); months there are no longer in Postgres
+    HISTORY_ARCHIVE_DIR: str = "archive"
+    # YoY insight cache lifetime; today's own average keeps moving during the day
+    YOY_CACHE_TTL_S: int = 900
 
     class Config:
         env_file = "../.env"
@@ -0,0 +1,62 @@
+"""
+api/core/http_cache.py — ETag / conditional GET helpers.
+ETags come from the pipeline sequence number (`seq`) of the newest reading a
+response depends on, plus that of the newest weather change for responses
+that include weather. They are read from the in-process live state, or from
+Redis when that is cold, so a matching If-None-Match is answered with a 304
+before any database work.
+"""
+
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+
+# Live data changes once per pipeline cycle (AQI_POLL_INTERVAL_S, 180 s by default)
+LIVE_CACHE_CONTROL = "public, max-age=30, stale-while-revalidate=150"
+HISTORY_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=900"
+
+
+async def data_version(request: Request, city_id: Optional[int] = None,
+                       weather: bool = False) -> Optional[str]:
+    """
+    Version tag of a city's data (or of all data when `city_id` is None), or
+    None if no version source is reachable. With `weather` the tag also
+    changes when only the weather does.
+    """
+    state = getattr(request.app.state, "live_state", None)
+    if state is not None and state.is_fresh():
+        if city_id is None:
+            tag = f"all-{state.head_seq}"
+            return f"{tag}-w{max(state.weather_seq.values(), default=0)}" if weather else tag
+        seq = state.city_seq(city_id)
+        if seq:
+            tag = f"c{city_id}-{seq}"
+            return f"{tag}-w{state.weather_seq.get(city_id, 0)}" if weather else tag
+    # Cold state: the global counter is coarser but shared by every worker, and
+    # weather changes take numbers from it too
+    try:
+        seq = await request.app.state.redis.get("aqi:seq")
+    except Exception:
+        return None
+    return f"g{seq}" if seq else None
+
+
+async def conditional_get(
+    request: Request, city_id: Optional[int] = None, cache_control: str = LIVE_CACHE_CONTROL,
+    weather: bool = False,
+) -> Tuple[Optional[Response], dict]:
+    """
+    Returns (304 response or None, headers for the full response). Routes
+    return the 304 as-is, or send the full body with the headers set. Pass
+    `weather=True` for responses that include weather.
+    """
+    version = await data_version(request, city_id, weather)
+    if version is None:
+        return None, {}
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    # GET uses weak comparison, so W/"x" (as some proxies rewrite it) matches too
+    tags = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers), headers
+    return None, headers
@@ -7,10 +7,20 @@ from contextlib import asynccontextmanager
 import redis.asyncio as aioredis
 from api.core.config import settings
 from api.core.db import AsyncSessionLocal
-from api.services.redis_bridge import redis_to_socket_bridge
+from api.services.redis_bridge import (
+    BridgeLeaderLock, LiveUpdateCoalescer, StreamFollower, stream_to_socket_bridge,
+    latest_stream_id, stream_metrics, city_room, station_room,
+)
+from api.services.live_state import LiveStationState, warm_load
 from api.routes import aqi, users, history, rankings, gamification
+from api.routes.aqi import city_snapshot
 
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+# Multi-worker / multi-node: rooms and emits go through a Redis message queue
+sio = socketio.AsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    client_manager=socketio.AsyncRedisManager(settings.REDIS_URL) if settings.MULTI_WORKER else None,
+)
 
 
 @asynccontextmanager
@@ -18,7 +28,20 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Startup: connect to Redis, start bridge
     try:
         app.state.redis = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-        app.state.bridge_task = asyncio.create_task(redis_to_socket_bridge(sio))
+        # Undecoded client for pre-serialized documents that are returned as-is
+        app.state.redis_raw = await aioredis.from_url(settings.REDIS_URL)
+        app.state.live_state = LiveStationState(max_age_s=settings.LIVE_STATE_MAX_AGE_S)
+        app.state.coalescer = LiveUpdateCoalescer(sio, window_s=settings.LIVE_COALESCE_WINDOW_MS / 1000)
+        # Every worker tails the live stream for its own live state; only one emits
+        leader = None
+        if settings.MULTI_WORKER:
+            leader = app.state.bridge_leader = BridgeLeaderLock(app.state.redis)
+            app.state.leader_task = asyncio.create_task(leader.run())
+        app.state.bridge_task = asyncio.create_task(stream_to_socket_bridge(app.state.coalescer, leader))
+        # Note the stream position before warm-loading so nothing falls in between
+        app.state.stream_follower = StreamFollower(app.state.live_state, await latest_stream_id(app.state.redis))
+        await warm_load(app.state.live_state, app.state.redis)
+        app.state.follower_task = asyncio.create_task(app.state.stream_follower.run())
     except Exception as e:
         print(f"Startup error: {e}")
 
@@ -27,8 +50,18 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Shutdown
     if hasattr(app.state, 'bridge_task'):
         app.state.bridge_task.cancel()
+    if hasattr(app.state, 'follower_task'):
+        app.state.follower_task.cancel()
+    if hasattr(app.state, 'leader_task'):
+        app.state.leader_task.cancel()
+        try:
+            await app.state.bridge_leader.release()
+        except Exception as e:
+            print(f"Bridge leader release failed: {e}")
     if hasattr(app.state, 'redis'):
         await app.state.redis.close()
+    if hasattr(app.state, 'redis_raw'):
+        await app.state.redis_raw.close()
 
 app = FastAPI(title="AQI Monitoring API", lifespan=lifespan)
 
@@ -54,10 +87,75 @@ sio_app = socketio.ASGIApp(sio, other_asgi_app=app)
 async def health_check():
     return {"status": "ok", "service": "AQI Backend API"}
 
+@app.get("/metrics")
+async def metrics():
+    coalescer = getattr(app.state, "coalescer", None)
+    leader = getattr(app.state, "bridge_leader", None)
+    try:
+        stream = await stream_metrics(app.state.redis, getattr(app.state, "stream_follower", None))
+    except Exception:
+        stream = None
+    try:
+        pipeline = await app.state.redis.hgetall("pipeline:stats") or None
+    except Exception:
+        pipeline = None
+    return {
+        "bridge": coalescer.stats() if coalescer else None,
+        "bridge_leader": leader.is_leader if leader else None,
+        "stream": stream,
+        "pipeline": pipeline,
+    }
+
 @sio.on("connect")
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     print(f"Client connected: {sid}")
+    # A (re)connecting client can name its rooms up front and get snapshots right away
+    if auth:
+        await _join(sid, auth)
 
 @sio.on("disconnect")
 async def disconnect(sid):
     print(f"Client disconnected: {sid}")
+
+# ── Subscriptions: clients join one room per city / station ──────────────────
+
+def _ids(data) -> tuple:
+    """City and station ids named by a subscribe payload: {city_id, city_ids, station_id, station_ids}."""
+    data = data or {}
+    city_ids = list(data.get("city_ids") or []) + ([data["city_id"]] if data.get("city_id") is not None else [])
+    station_ids = list(data.get("station_ids") or []) + ([data["station_id"]] if data.get("station_id") is not None else [])
+    return [int(c) for c in city_ids], [int(s) for s in station_ids]
+
+def _rooms(data) -> list:
+    city_ids, station_ids = _ids(data)
+    return [city_room(c) for c in city_ids] + [station_room(s) for s in station_ids]
+
+async def _join(sid, data) -> dict:
+    try:
+        city_ids, station_ids = _ids(data)
+    except (TypeError, ValueError, AttributeError):
+        return {"ok": False, "error": "city_id / station_id must be integers"}
+    rooms = [city_room(c) for c in city_ids] + [station_room(s) for s in station_ids]
+    for room in rooms:
+        await sio.enter_room(sid, room)
+    # Snapshot after joining, so no delta falls between the two; live deltas
+    # that race ahead of it are newer and the client keeps them on top
+    if (data or {}).get("snapshot"):
+        for city_id in city_ids:
+            await sio.emit("aqi_snapshot", await city_snapshot(app, city_id), to=sid)
+    return {"ok": True, "rooms": rooms}
+
+@sio.on("subscribe")
+async def subscribe(sid, data):
+    """Joins rooms; with `snapshot: true` each city's current state is sent first."""
+    return await _join(sid, data)
+
+@sio.on("unsubscribe")
+async def unsubscribe(sid, data):
+    try:
+        rooms = _rooms(data)
+    except (TypeError, ValueError, AttributeError):
+        return {"ok": False, "error": "city_id / station_id must be integers"}
+    for room in rooms:
+        await sio.leave_room(sid, room)
+    return {"ok": True, "rooms": rooms}
@@ -9,6 +9,7 @@ class City(Base):
     display_name = Column(String, unique=True, index=True)
     lat = Column(Float)
     lon = Column(Float)
+    timezone = Column(String, default="Asia/Kolkata")
     stations = relationship("Station", back_populates="city")
 
 class Station(Base):
@@ -34,8 +35,43 @@ class StationAQIHistory(Base):
     o3 = Column(Float, default=0)
     co = Column(Float, default=0)
     so2 = Column(Float, default=0)
-    lat = Column(Float, default=0)
-    lon = Column(Float, default=0)
+    health_category = Column(Text, default="")
+    recorded_at = Column(String)
+    # Partition key, hence part of the primary key
+    recorded_ts = Column(DateTime(timezone=True), primary_key=True)
+    time = Column(BigInteger)
+    diff = Column(Integer)
+    station = relationship("Station", back_populates="aqi_history")
+
+class CityWeatherHistory(Base):
+    """Weather and AQI forecast, one row per city per pipeline cycle."""
+    __tablename__ = "city_weather_history"
+    id = Column(BigInteger, primary_key=True)
+    city_id = Column(Integer, ForeignKey("city_registry.id"))
+    temp = Column(Float, default=0)
+    feels_like = Column(Float, default=0)
+    humidity = Column(Integer, default=0)
+    wind_speed = Column(Float, default=0)
+    uv_index = Column(Float, default=0)
+    precip_prob = Column(Integer, default=0)
+    forecast_aqi_24h = Column(Text, default="[]")
+    recorded_at = Column(String)
+    recorded_ts = Column(DateTime(timezone=True))
+    time = Column(BigInteger)
+    diff = Column(Integer)
+
+class StationLatest(Base):
+    """One row per station, upserted by the pipeline's snapshot sink."""
+    __tablename__ = "station_latest"
+    station_id = Column(Integer, ForeignKey("city_stations.id"), primary_key=True)
+    city_id = Column(Integer, ForeignKey("city_registry.id"))
+    aqi = Column(Float)
+    pm25 = Column(Float)
+    pm10 = Column(Float)
+    no2 = Column(Float, default=0)
+    o3 = Column(Float, default=0)
+    co = Column(Float, default=0)
+    so2 = Column(Float, default=0)
     health_category = Column(Text, default="")
     temp = Column(Float, default=0)
     humidity = Column(Integer, default=0)
@@ -46,4 +82,3 @@ class StationAQIHistory(Base):
     recorded_at = Column(String)
     time = Column(BigInteger)
     diff = Column(Integer)
-    station = relationship("Station", back_populates="aqi_history")
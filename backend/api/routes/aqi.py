@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, func, text
+from datetime import timedelta
 from typing import List, Optional
 import json
 import httpx
+from api.core.config import settings
 from api.core.db import get_db
-from api.models.aqi import City, Station, StationAQIHistory
-from api.services.aqi_service import get_yoy_insight
+from api.core.http_cache import conditional_get
+from api.models.aqi import City, CityWeatherHistory, Station, StationAQIHistory, StationLatest
+from api.services.aqi_service import city_timezone, get_yoy_insight
+from api.services.live_state import LiveStationState
+from pathway_pipeline.aqi_summary import city_summary, classify_aqi as _classify
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -38,24 +43,119 @@ async def get_cities(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(City))
     return result.scalars().all()
 
+# ── Live snapshot of every station (bulk, for the Heatmap) ────────────────────
+
+@router.get("/snapshot")
+async def get_live_snapshot(
+    request: Request,
+    city_id: Optional[List[int]] = Query(None, description="Restrict to these city ids"),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Returns every city's stations with their latest reading in one response.
+    Built from a single registry query and a single Redis MGET, so the Heatmap
+    no longer needs one /stations round trip per city.
+    """
+    query = select(Station, City).join(City, City.id == Station.city_id)
+    if city_id:
+        query = query.where(Station.city_id.in_(city_id))
+    if bbox:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+        query = query.where(
+            Station.lon.between(min_lon, max_lon),
+            Station.lat.between(min_lat, max_lat),
+        )
+    rows = (await db.execute(query.order_by(Station.city_id, Station.id))).all()
+    if not rows:
+        return []
+
+    station_ids = [s.id for s, _ in rows]
+    latest = {}
+    try:
+        redis = request.app.state.redis
+        raws = await redis.mget([f"station:{sid}:latest" for sid in station_ids])
+        latest = {sid: json.loads(raw) for sid, raw in zip(station_ids, raws) if raw}
+    except Exception:
+        pass
+
+    missing = [sid for sid in station_ids if sid not in latest]
+    if missing:
+        # DB fallback for stations Redis has no (or an expired) reading for:
+        # one primary-key lookup covering all of them
+        result = await db.execute(
+            select(
+                StationLatest.station_id, StationLatest.aqi, StationLatest.pm25,
+                StationLatest.pm10, StationLatest.health_category,
+            ).where(StationLatest.station_id.in_(missing))
+        )
+        latest.update({r["station_id"]: dict(r) for r in result.mappings().all()})
+
+    cities = {}
+    for s, c in rows:
+        entry = cities.get(c.id)
+        if entry is None:
+            entry = cities[c.id] = {
+                "city_id": c.id, "display_name": c.display_name,
+                "lat": c.lat, "lon": c.lon,
+                "aqi": None, "station_count": 0, "stations": [],
+            }
+        entry["stations"].append(_station_payload(s, latest.get(s.id)))
+
+    for entry in cities.values():
+        live = [st["aqi"] for st in entry["stations"] if st["aqi"] is not None]
+        entry["station_count"] = len(live)
+        if live:
+            entry["aqi"] = round(sum(live) / len(live))
+    return list(cities.values())
+
+# ── Delta sync: stations changed since a sequence number ──────────────────────
+
+@router.get("/changes")
+async def get_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Last `seq` the client has seen; 0 for a full sync"),
+    city_id: Optional[int] = Query(None),
+):
+    """
+    Latest record of every station that changed after sequence number `since`
+    (the `seq` the pipeline stamps on each reading), oldest change first. The
+    returned `seq` is what the client sends next time. With `resync: true`
+    the client's `since` couldn't be answered and `changes` is the full set.
+    `weather` lists the cities whose weather changed in the same range.
+    """
+    state = _live_state(request)
+    if state is None or not state.is_fresh():
+        raise HTTPException(status_code=503, detail="Live state unavailable; use /snapshot")
+    head = state.head_seq
+
+    if since > head:
+        # This worker may just be behind the pipeline; only a reset counter means resync
+        try:
+            current = int(await request.app.state.redis.get("aqi:seq") or 0)
+        except Exception:
+            current = 0
+        if since <= current:
+            return {"seq": since, "resync": False, "changes": [], "weather": []}
+
+    resync = since == 0 or since > head or head - since > settings.CHANGES_MAX_LAG
+    since = 0 if resync else since
+    return {"seq": head, "resync": resync, "changes": state.changes_since(since, city_id),
+            "weather": state.weather_since(since, city_id)}
+
 # ── City latest AQI (aggregate of all stations) ───────────────────────────────
 
 @router.get("/cities/{city_id}/latest")
 async def get_latest_aqi(city_id: int, db: AsyncSession = Depends(get_db)):
-    stations_result = await db.execute(select(Station).where(Station.city_id == city_id))
-    stations = stations_result.scalars().all()
-    if not stations:
+    rows = await _latest_by_station(db, city_id)
+    if not rows:
         raise HTTPException(status_code=404, detail="City or stations not found")
 
     latest_data = []
-    for station in stations:
-        history_result = await db.execute(
-            select(StationAQIHistory)
-            .where(StationAQIHistory.station_id == station.id, StationAQIHistory.diff == 1)
-            .order_by(desc(StationAQIHistory.time))
-            .limit(1)
-        )
-        history = history_result.scalar_one_or_none()
+    for station, history in rows:
         if history:
             latest_data.append({
                 "station_id": station.id,
@@ -78,7 +178,23 @@ async def get_latest_aqi(city_id: int, db: AsyncSession = Depends(get_db)):
 # ── City AQI summary (single number — avg across active stations) ─────────────
 
 @router.get("/cities/{city_id}/summary")
-async def get_city_summary(city_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_city_summary(city_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    not_modified, headers = await conditional_get(request, city_id, weather=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    # In-process live state: no network round trip at all
+    state = _live_state(request)
+    readings = state.city_readings(city_id) if state else None
+    if readings:
+        return city_summary(city_id, readings)
+
+    # Pipeline-published document: one HMGET, bytes returned unchanged
+    doc = await _city_doc(request, city_id, "summary")
+    if doc is not None:
+        doc.headers.update(headers)
+        return doc
+
     # Try Redis first for sub-second response
     try:
         redis = request.app.state.redis
@@ -88,48 +204,21 @@ async def get_city_summary(city_id: int, request: Request, db: AsyncSession = De
         if not stations:
             raise HTTPException(status_code=404, detail="City not found")
 
-        readings = []
-        for s in stations:
-            raw = await redis.get(f"station:{s.id}:latest")
-            if raw:
-                readings.append(json.loads(raw))
+        raws = await redis.mget([f"station:{s.id}:latest" for s in stations])
+        readings = [json.loads(raw) for raw in raws if raw]
 
         if readings:
-            avg_aqi = sum(r["aqi"] for r in readings) / len(readings)
-            # Take weather from the first station that has it
-            weather_station = next((r for r in readings if r.get("temp")), readings[0])
-            return {
-                "city_id": city_id,
-                "aqi": round(avg_aqi),
-                "station_count": len(readings),
-                "health_category": _classify(avg_aqi),
-                "temp": weather_station.get("temp", 0),
-                "feels_like": weather_station.get("feels_like", 0),
-                "humidity": weather_station.get("humidity", 0),
-                "wind_speed": weather_station.get("wind_speed", 0),
-                "uv_index": weather_station.get("uv_index", 0),
-                "precip_prob": weather_station.get("precip_prob", 0),
-                "forecast_aqi_24h": weather_station.get("forecast_aqi_24h", "[]"),
-                "stations": readings,
-            }
+            return city_summary(city_id, readings)
     except Exception:
         pass
 
     # Fallback: DB query
-    stations_result = await db.execute(select(Station).where(Station.city_id == city_id))
-    stations = stations_result.scalars().all()
-    if not stations:
+    rows = await _latest_by_station(db, city_id)
+    if not rows:
         raise HTTPException(status_code=404, detail="City not found")
 
     latest_data = []
-    for station in stations:
-        history_result = await db.execute(
-            select(StationAQIHistory)
-            .where(StationAQIHistory.station_id == station.id, StationAQIHistory.diff == 1)
-            .order_by(desc(StationAQIHistory.time))
-            .limit(1)
-        )
-        h = history_result.scalar_one_or_none()
+    for station, h in rows:
         if h:
             latest_data.append({
                 "station_id": station.id,
@@ -156,59 +245,68 @@ async def get_city_summary(city_id: int, request: Request, db: AsyncSession = De
     if not latest_data:
         raise HTTPException(status_code=404, detail="No data yet for this city")
 
-    avg_aqi = sum(r["aqi"] for r in latest_data) / len(latest_data)
-    ref = latest_data[0]
-    return {
-        "city_id": city_id,
-        "aqi": round(avg_aqi),
-        "station_count": len(latest_data),
-        "health_category": _classify(avg_aqi),
-        "temp": ref["temp"],
-        "feels_like": ref["feels_like"],
-        "humidity": ref["humidity"],
-        "wind_speed": ref["wind_speed"],
-        "uv_index": ref["uv_index"],
-        "precip_prob": ref["precip_prob"],
-        "forecast_aqi_24h": ref["forecast_aqi_24h"],
-        "stations": latest_data,
-    }
+    return city_summary(city_id, latest_data)
 
 # ── Stations for a city ───────────────────────────────────────────────────────
 
 @router.get("/cities/{city_id}/recent")
 async def get_recent_readings(city_id: int, limit: int = 10, db: AsyncSession = Depends(get_db)):
     """
-    Returns the last `limit` city-level AQI readings (grouped by 3-minute bucket)
-    so the frontend can show a live update history table.
+    Returns the last `limit` city-level AQI readings (grouped by 3-minute bucket,
+    labelled in the city's local time) so the frontend can show a live update
+    history table.
     """
     result = await db.execute(
         text("""
+            WITH local AS (
+                SELECT recorded_ts AT TIME ZONE CAST(:tz AS text) AS ts, aqi, station_id
+                FROM station_aqi_history
+                WHERE city_id = :city_id
+                  AND diff = 1
+                  -- Buckets are one pipeline cycle apart; an hour per bucket
+                  -- below the newest reading leaves room for polling gaps
+                  AND recorded_ts >= (
+                      SELECT MAX(recorded_ts) FROM station_aqi_history
+                      WHERE city_id = :city_id AND diff = 1
+                  ) - make_interval(hours => :limit)
+            )
             SELECT
                 to_char(
-                    date_trunc('minute', recorded_at::timestamp)
-                    - (EXTRACT(MINUTE FROM recorded_at::timestamp)::int % 3 * interval '1 minute'),
+                    date_trunc('minute', ts)
+                    - (EXTRACT(MINUTE FROM ts)::int % 3 * interval '1 minute'),
                     'YYYY-MM-DD"T"HH24:MI:SS'
                 ) AS bucket,
                 ROUND(AVG(aqi))::int          AS aqi,
                 MIN(aqi)::int                 AS aqi_min,
                 MAX(aqi)::int                 AS aqi_max,
                 COUNT(DISTINCT station_id)    AS station_count
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND recorded_at IS NOT NULL
+            FROM local
             GROUP BY bucket
             ORDER BY bucket DESC
             LIMIT :limit
         """),
-        {"city_id": city_id, "limit": limit},
+        {"city_id": city_id, "limit": limit, "tz": await city_timezone(db, city_id)},
     )
     rows = result.mappings().all()
     return [dict(r) for r in rows]
 
 
 @router.get("/cities/{city_id}/stations")
-async def get_city_stations(city_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_city_stations(city_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    not_modified, headers = await conditional_get(request, city_id)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    state = _live_state(request)
+    live = state.city_stations(city_id) if state else None
+    if live:
+        return live
+
+    doc = await _city_doc(request, city_id, "stations")
+    if doc is not None:
+        doc.headers.update(headers)
+        return doc
+
     stations_result = await db.execute(select(Station).where(Station.city_id == city_id))
     stations = stations_result.scalars().all()
     if not stations:
@@ -216,35 +314,17 @@ async def get_city_stations(city_id: int, request: Request, db: AsyncSession = D
 
     try:
         redis = request.app.state.redis
-        out = []
-        for s in stations:
-            raw = await redis.get(f"station:{s.id}:latest")
-            if raw:
-                d = json.loads(raw)
-                out.append({
-                    "id": s.id, "station_name": s.station_name,
-                    "lat": s.lat, "lon": s.lon,
-                    "aqi": d.get("aqi", 0),
-                    "pm25": d.get("pm25", 0), "pm10": d.get("pm10", 0),
-                    "health_category": d.get("health_category", ""),
-                })
-            else:
-                out.append({"id": s.id, "station_name": s.station_name,
-                             "lat": s.lat, "lon": s.lon, "aqi": None,
-                             "pm25": None, "pm10": None, "health_category": None})
-        return out
+        raws = await redis.mget([f"station:{s.id}:latest" for s in stations])
+        return [
+            _station_payload(s, json.loads(raw) if raw else None)
+            for s, raw in zip(stations, raws)
+        ]
     except Exception:
         pass
 
     # DB fallback
     out = []
-    for s in stations:
-        h_result = await db.execute(
-            select(StationAQIHistory)
-            .where(StationAQIHistory.station_id == s.id, StationAQIHistory.diff == 1)
-            .order_by(desc(StationAQIHistory.time)).limit(1)
-        )
-        h = h_result.scalar_one_or_none()
+    for s, h in await _latest_by_station(db, city_id):
         out.append({
             "id": s.id, "station_name": s.station_name, "lat": s.lat, "lon": s.lon,
             "aqi": h.aqi if h else None,
@@ -258,28 +338,40 @@ async def get_city_stations(city_id: int, request: Request, db: AsyncSession = D
 
 @router.get("/stations/{station_id}/history")
 async def get_station_history(station_id: int, limit: int = 48, db: AsyncSession = Depends(get_db)):
+    """
+    Latest `limit` points for a station. Readings older than the compaction
+    horizon are hourly averages (sample_count > 1) from station_aqi_hourly.
+    """
     result = await db.execute(
-        select(StationAQIHistory)
-        .where(StationAQIHistory.station_id == station_id, StationAQIHistory.diff == 1)
-        .order_by(desc(StationAQIHistory.time))
-        .limit(limit)
+        text("""
+            SELECT time, recorded_at, sample_count,
+                   aqi_avg AS aqi, pm25_avg AS pm25, pm10_avg AS pm10,
+                   no2_avg AS no2, o3_avg AS o3, co_avg AS co, so2_avg AS so2,
+                   health_category
+            FROM station_aqi_tiered
+            WHERE station_id = :station_id
+            ORDER BY recorded_ts DESC
+            LIMIT :limit
+        """),
+        {"station_id": station_id, "limit": limit},
     )
-    rows = result.scalars().all()
+    rows = result.mappings().all()
     return [
         {
-            "time": r.time,
-            "recorded_at": r.recorded_at,
-            "aqi": r.aqi, "pm25": r.pm25, "pm10": r.pm10,
-            "no2": r.no2, "o3": r.o3, "co": r.co, "so2": r.so2,
-            "health_category": r.health_category,
+            **r,
+            "health_category": r["health_category"] or (_classify(r["aqi"]) if r["aqi"] is not None else None),
         }
         for r in reversed(rows)
     ]
 
-# ── Weather (Redis cache → OpenMeteo fallback) ────────────────────────────────
+# ── Weather (Redis cache → last pipeline row → OpenMeteo fallback) ────────────
 
 @router.get("/cities/{city_id}/weather")
-async def get_weather(city_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_weather(city_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    not_modified, headers = await conditional_get(request, city_id, weather=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     # Redis cache hit
     try:
         redis = request.app.state.redis
@@ -289,6 +381,26 @@ async def get_weather(city_id: int, request: Request, db: AsyncSession = Depends
     except Exception:
         pass
 
+    # The pipeline's last weather row for the city, if it's still fresh
+    result = await db.execute(
+        select(CityWeatherHistory)
+        .where(
+            CityWeatherHistory.city_id == city_id,
+            CityWeatherHistory.diff == 1,
+            CityWeatherHistory.recorded_ts > func.now() - timedelta(seconds=settings.LIVE_STATE_MAX_AGE_S),
+        )
+        .order_by(desc(CityWeatherHistory.recorded_ts))
+        .limit(1)
+    )
+    row = result.scalar_one_or_none()
+    if row:
+        return {
+            "city_id": city_id,
+            "temp": row.temp, "feels_like": row.feels_like, "humidity": row.humidity,
+            "wind_speed": row.wind_speed, "uv_index": row.uv_index, "precip_prob": row.precip_prob,
+            "forecast_aqi_24h": row.forecast_aqi_24h or "[]",
+        }
+
     # Fallback: fetch from OpenMeteo directly
     city_result = await db.execute(select(City).where(City.id == city_id))
     city = city_result.scalar_one_or_none()
@@ -353,12 +465,12 @@ async def get_pollutant_history(
 # ── Year-over-Year Insight ────────────────────────────────────────────────────
 
 @router.get("/cities/{city_id}/yoy-insight")
-async def yoy_insight(city_id: int, db: AsyncSession = Depends(get_db)):
+async def yoy_insight(city_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Compares today's AQI against the same calendar day across all available
-    years in station_aqi_history. Powers the YoYInsightCard on the Dashboard.
+    years (city_day_of_year_stats). Powers the YoYInsightCard on the Dashboard.
     """
-    return await get_yoy_insight(city_id, db)
+    return await get_yoy_insight(city_id, db, request.app.state.redis)
 
 # ── Health recommendation ─────────────────────────────────────────────────────
 
@@ -400,10 +512,78 @@ async def get_health_rec(aqi: int, age: int = 25, condition: str = "none"):
 
 # ── Helper ────────────────────────────────────────────────────────────────────
 
-def _classify(aqi: float) -> str:
-    if aqi <= 50:    return "Good"
-    elif aqi <= 100: return "Moderate"
-    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
-    elif aqi <= 200: return "Unhealthy"
-    elif aqi <= 300: return "Very Unhealthy"
-    else:            return "Hazardous"
+async def _latest_by_station(db: AsyncSession, city_id: int) -> list:
+    """
+    Every station of a city paired with its station_latest row (or None),
+    in a single query regardless of how many stations the city has.
+    """
+    result = await db.execute(
+        select(Station, StationLatest)
+        .outerjoin(StationLatest, StationLatest.station_id == Station.id)
+        .where(Station.city_id == city_id)
+        .order_by(Station.id)
+    )
+    return result.all()
+
+def _live_state(request: Request) -> Optional[LiveStationState]:
+    return getattr(request.app.state, "live_state", None)
+
+async def _city_doc(request: Request, city_id: int, field: str) -> Optional[Response]:
+    """
+    Returns the pipeline-published `summary` or `stations` document for a city
+    as a raw JSON response, or None if it isn't in Redis.
+    """
+    try:
+        body, version = await request.app.state.redis_raw.hmget(
+            f"city:{city_id}:docs", field, "version"
+        )
+    except Exception:
+        return None
+    if body is None:
+        return None
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"X-Data-Version": (version or b"0").decode()},
+    )
+
+def _station_payload(s: Station, d: Optional[dict]) -> dict:
+    """Shape of one entry in the /stations and /snapshot responses."""
+    return {
+        "id": s.id, "station_name": s.station_name,
+        "lat": s.lat, "lon": s.lon,
+        "aqi": d.get("aqi", 0) if d else None,
+        "pm25": d.get("pm25", 0) if d else None,
+        "pm10": d.get("pm10", 0) if d else None,
+        "health_category": d.get("health_category", "") if d else None,
+    }
+
+async def city_snapshot(app, city_id: int) -> dict:
+    """
+    Current summary, stations and weather of a city for a socket client that
+    just joined its room. Served from the live state or the pipeline-published
+    Redis documents; a part that is unavailable is None and the client falls
+    back to the REST endpoint for it.
+    """
+    snapshot = {"city_id": city_id, "summary": None, "stations": None, "weather": None}
+    state = getattr(app.state, "live_state", None)
+    if state is not None:
+        readings = state.city_readings(city_id)
+        if readings:
+            snapshot["summary"] = city_summary(city_id, readings)
+            snapshot["stations"] = state.city_stations(city_id)
+        if city_id in state.weather:
+            snapshot["weather"] = {"city_id": city_id, **state.weather[city_id]}
+    if snapshot["summary"] is None or snapshot["weather"] is None:
+        try:
+            redis = app.state.redis
+            summary, stations = await redis.hmget(f"city:{city_id}:docs", "summary", "stations")
+            weather = await redis.get(f"weather:{city_id}")
+            if snapshot["summary"] is None and summary:
+                snapshot["summary"] = json.loads(summary)
+                snapshot["stations"] = json.loads(stations) if stations else None
+            if snapshot["weather"] is None and weather:
+                snapshot["weather"] = json.loads(weather)
+        except Exception:
+            pass
+    return snapshot
@@ -1,12 +1,21 @@
 """
 api/routes/history.py — Historical AQI analysis endpoints
 Provides monthly year-over-year overlay, day/night trend, and date-range stats.
+All of them read the city_aqi_hourly / city_aqi_daily rollups, bucketed in
+the city's local time (city_registry.timezone);
+monthly, range and years add months moved to the Parquet archive; yoy-day
+reads city_day_of_year_stats, which keeps them.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from api.core.db import get_db
+from api.core.http_cache import conditional_get, HISTORY_CACHE_CONTROL
+from api.services.aqi_service import CITY_YEARS_SQL, city_timezone, yoy_day_averages
+from api.services.history_archive import archived_daily, archived_years
 
 router = APIRouter(prefix="/history", tags=["history"])
 
@@ -16,6 +25,8 @@ router = APIRouter(prefix="/history", tags=["history"])
 @router.get("/city/{city_id}/monthly")
 async def monthly_history(
     city_id: int,
+    request: Request,
+    response: Response,
     month: int = Query(..., ge=1, le=12, description="Month number 1–12"),
     db: AsyncSession = Depends(get_db),
 ):
@@ -23,29 +34,41 @@ async def monthly_history(
     Returns daily AQI for the given month across all available years.
     Used for the year-over-year overlay chart.
     """
+    not_modified, headers = await conditional_get(request, city_id, HISTORY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     result = await db.execute(
-        text("""
+        text(f"""
             SELECT
-                EXTRACT(YEAR  FROM recorded_at::timestamp)::int AS year,
-                EXTRACT(DAY   FROM recorded_at::timestamp)::int AS day,
-                ROUND(AVG(aqi))::int                            AS avg_aqi,
-                MAX(aqi)::int                                   AS max_aqi,
-                MIN(aqi)::int                                   AS min_aqi,
-                COUNT(*)                                        AS sample_count
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND recorded_at IS NOT NULL
-              AND EXTRACT(MONTH FROM recorded_at::timestamp) = :month
-            GROUP BY year, day
+                EXTRACT(YEAR FROM r.day)::int               AS year,
+                EXTRACT(DAY  FROM r.day)::int               AS day,
+                ROUND(r.aqi_sum / r.sample_count)::int      AS avg_aqi,
+                r.aqi_max::int                              AS max_aqi,
+                r.aqi_min::int                              AS min_aqi,
+                r.sample_count                              AS sample_count
+            FROM {CITY_YEARS_SQL}
+            JOIN city_aqi_daily r
+              ON r.city_id = :city_id
+             AND r.day >= make_date(y, CAST(:month AS int), 1)
+             AND r.day <  make_date(y, CAST(:month AS int), 1) + INTERVAL '1 month'
             ORDER BY year, day
         """),
         {"city_id": city_id, "month": month},
     )
-    rows = result.mappings().all()
-    if not rows:
-        return []
-    return [dict(r) for r in rows]
+    rows = [dict(r) for r in result.mappings().all()]
+    rows += [
+        {
+            "year": d["day"].year,
+            "day": d["day"].day,
+            "avg_aqi": round(d["aqi_sum"] / d["sample_count"]),
+            "max_aqi": int(d["aqi_max"]),
+            "min_aqi": int(d["aqi_min"]),
+            "sample_count": d["sample_count"],
+        }
+        for d in await archived_daily(city_id, await city_timezone(db, city_id), month=month)
+    ]
+    return sorted(rows, key=lambda r: (r["year"], r["day"]))
 
 
 # ── Day/Night 24-hour trend ───────────────────────────────────────────────────
@@ -53,30 +76,35 @@ async def monthly_history(
 @router.get("/city/{city_id}/daynight")
 async def day_night_trend(
     city_id: int,
+    request: Request,
+    response: Response,
     days: int = Query(30, ge=7, le=365, description="Look-back window in days"),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Returns hourly AQI averages split into day (6 AM–6 PM) and night periods.
+    Returns hourly AQI averages split into day (6 AM–6 PM local) and night periods.
     Used for the 24-bar day/night trend chart.
     """
+    not_modified, headers = await conditional_get(request, city_id, HISTORY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     result = await db.execute(
         text("""
             SELECT
-                EXTRACT(HOUR FROM recorded_at::timestamp)::int  AS hour,
-                ROUND(AVG(aqi))::int                            AS avg_aqi,
-                MAX(aqi)::int                                   AS max_aqi,
-                MIN(aqi)::int                                   AS min_aqi,
+                EXTRACT(HOUR FROM h.bucket AT TIME ZONE c.timezone)::int    AS hour,
+                ROUND(SUM(h.aqi_sum) / SUM(h.sample_count))::int            AS avg_aqi,
+                MAX(h.aqi_max)::int                                         AS max_aqi,
+                MIN(h.aqi_min)::int                                         AS min_aqi,
                 CASE
-                    WHEN EXTRACT(HOUR FROM recorded_at::timestamp) BETWEEN 6 AND 17
+                    WHEN EXTRACT(HOUR FROM h.bucket AT TIME ZONE c.timezone) BETWEEN 6 AND 17
                     THEN 'day'
                     ELSE 'night'
-                END                                             AS period
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND recorded_at IS NOT NULL
-              AND recorded_at::timestamp > NOW() - make_interval(days => :days)
+                END                                                         AS period
+            FROM city_aqi_hourly h
+            JOIN city_registry c ON c.id = h.city_id
+            WHERE h.city_id = :city_id
+              AND h.bucket > NOW() - make_interval(days => :days)
             GROUP BY hour, period
             ORDER BY hour
         """),
@@ -91,34 +119,49 @@ async def day_night_trend(
 @router.get("/city/{city_id}/range")
 async def range_stats(
     city_id: int,
+    request: Request,
+    response: Response,
     start: str = Query(..., description="ISO date, e.g. 2024-01-01"),
     end:   str = Query(..., description="ISO date, e.g. 2024-12-31"),
     db: AsyncSession = Depends(get_db),
 ):
     """Returns AQI min / max / avg and timestamps for an arbitrary date range."""
+    not_modified, headers = await conditional_get(request, city_id, HISTORY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     try:
         result = await db.execute(
             text("""
                 SELECT
-                    MIN(aqi)::int                            AS min_aqi,
-                    MAX(aqi)::int                            AS max_aqi,
-                    ROUND(AVG(aqi))::int                     AS avg_aqi,
-                    MIN(recorded_at::timestamp)              AS recorded_min_at,
-                    MAX(recorded_at::timestamp)              AS recorded_max_at,
-                    COUNT(*)                                 AS sample_count
-                FROM station_aqi_history
+                    MIN(aqi_min)            AS aqi_min,
+                    MAX(aqi_max)            AS aqi_max,
+                    SUM(aqi_sum)            AS aqi_sum,
+                    MIN(first_recorded_at)  AS first_recorded_at,
+                    MAX(last_recorded_at)   AS last_recorded_at,
+                    SUM(sample_count)       AS sample_count
+                FROM city_aqi_daily
                 WHERE city_id = :city_id
-                  AND diff = 1
-                  AND recorded_at IS NOT NULL
-                  AND recorded_at::timestamp BETWEEN :start::timestamp
-                                                  AND (:end::timestamp + INTERVAL '23 hours 59 minutes')
+                  AND day BETWEEN CAST(:start AS date) AND CAST(:end AS date)
             """),
             {"city_id": city_id, "start": start, "end": end},
         )
-        row = result.mappings().first()
-        if not row or row["avg_aqi"] is None:
+        hot = result.mappings().first()
+        parts = [dict(hot)] if hot and hot["sample_count"] else []
+        parts += await archived_daily(
+            city_id, await city_timezone(db, city_id), date.fromisoformat(start), date.fromisoformat(end)
+        )
+        if not parts:
             raise HTTPException(status_code=404, detail="No data for the given range")
-        return dict(row)
+        sample_count = sum(p["sample_count"] for p in parts)
+        return {
+            "min_aqi": int(min(p["aqi_min"] for p in parts)),
+            "max_aqi": int(max(p["aqi_max"] for p in parts)),
+            "avg_aqi": round(sum(p["aqi_sum"] for p in parts) / sample_count),
+            "recorded_min_at": min(p["first_recorded_at"] for p in parts),
+            "recorded_max_at": max(p["last_recorded_at"] for p in parts),
+            "sample_count": sample_count,
+        }
     except (ValueError, Exception) as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -126,21 +169,28 @@ async def range_stats(
 # ── Available years for a city ────────────────────────────────────────────────
 
 @router.get("/city/{city_id}/years")
-async def available_years(city_id: int, db: AsyncSession = Depends(get_db)):
+async def available_years(city_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
     """Returns the list of calendar years that have data for this city."""
+    not_modified, headers = await conditional_get(request, city_id, HISTORY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
     result = await db.execute(
-        text("""
-            SELECT DISTINCT EXTRACT(YEAR FROM recorded_at::timestamp)::int AS year
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND recorded_at IS NOT NULL
+        text(f"""
+            SELECT y AS year
+            FROM {CITY_YEARS_SQL}
+            WHERE EXISTS (
+                SELECT 1 FROM city_aqi_daily
+                WHERE city_id = :city_id
+                  AND day >= make_date(y, 1, 1)
+                  AND day <  make_date(y + 1, 1, 1)
+            )
             ORDER BY year
         """),
         {"city_id": city_id},
     )
-    rows = result.mappings().all()
-    return [r["year"] for r in rows]
+    years = {r["year"] for r in result.mappings().all()}
+    return sorted(years.union(archived_years(city_id)))
 
 
 # ── Year-over-year comparison for a specific calendar day ────────────────────
@@ -148,6 +198,8 @@ async def available_years(city_id: int, db: AsyncSession = Depends(get_db)):
 @router.get("/city/{city_id}/yoy-day")
 async def yoy_day_comparison(
     city_id: int,
+    request: Request,
+    response: Response,
     month: int = Query(..., ge=1, le=12),
     day:   int = Query(..., ge=1, le=31),
     db: AsyncSession = Depends(get_db),
@@ -156,21 +208,8 @@ async def yoy_day_comparison(
     Returns one row per year showing the average AQI on the given calendar
     day (month + day). Powers the YoY insight card on the Dashboard.
     """
-    result = await db.execute(
-        text("""
-            SELECT
-                EXTRACT(YEAR FROM recorded_at::timestamp)::int AS year,
-                ROUND(AVG(aqi))::int                           AS avg_aqi
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND aqi IS NOT NULL
-              AND EXTRACT(MONTH FROM recorded_at::timestamp) = :month
-              AND EXTRACT(DAY   FROM recorded_at::timestamp) = :day
-            GROUP BY year
-            ORDER BY avg_aqi DESC
-        """),
-        {"city_id": city_id, "month": month, "day": day},
-    )
-    rows = result.mappings().all()
-    return [dict(r) for r in rows]
+    not_modified, headers = await conditional_get(request, city_id, HISTORY_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    return await yoy_day_averages(db, city_id, month, day)
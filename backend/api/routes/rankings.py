@@ -3,10 +3,12 @@ api/routes/rankings.py — City weather & AQI ranking endpoints
 Returns latest temperature/AQI per city, suitable for leaderboard-style views.
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from api.core.db import get_db
+from api.core.http_cache import conditional_get
+from pathway_pipeline.aqi_summary import classify_aqi
 
 router = APIRouter(prefix="/rankings", tags=["rankings"])
 
@@ -15,6 +17,8 @@ router = APIRouter(prefix="/rankings", tags=["rankings"])
 
 @router.get("/weather")
 async def weather_rankings(
+    request: Request,
+    response: Response,
     limit: int = Query(50, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
 ):
@@ -22,67 +26,115 @@ async def weather_rankings(
     Returns the most recent temperature reading per city, sorted hottest first.
     Client can reverse the list for coldest ranking.
     """
-    result = await db.execute(
-        text("""
-            SELECT DISTINCT ON (h.city_id)
-                h.city_id,
-                cr.display_name AS city,
-                cr.country_code,
-                h.temp,
-                h.humidity,
-                h.wind_speed,
-                h.uv_index,
-                h.aqi,
-                h.health_category,
-                h.recorded_at
-            FROM station_aqi_history h
-            JOIN city_registry cr ON cr.id = h.city_id
-            WHERE h.temp IS NOT NULL
-              AND h.temp <> 0
-              AND h.diff = 1
-            ORDER BY h.city_id, h.recorded_at DESC NULLS LAST
-        """)
-    )
-    rows = result.mappings().all()
-
-    # Sort hottest first, then trim to limit
-    sorted_rows = sorted(rows, key=lambda r: r["temp"] or 0, reverse=True)[:limit]
-    return [dict(r) for r in sorted_rows]
+    not_modified, headers = await conditional_get(request, weather=True)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    rows = _live_rankings(request) or await _db_rankings(db)
+    rows = [r for r in rows if r["temp"]]
+    return sorted(rows, key=lambda r: r["temp"], reverse=True)[:limit]
 
 
 # ── AQI Rankings ─────────────────────────────────────────────────────────────
 
 @router.get("/aqi")
 async def aqi_rankings(
+    request: Request,
+    response: Response,
     limit: int = Query(50, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Returns the most recent AQI reading per city, sorted most-polluted first.
+    Returns each city's AQI (mean over its stations), sorted most-polluted first.
     Client reverses for cleanest ranking.
     """
+    not_modified, headers = await conditional_get(request)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+    rows = _live_rankings(request) or await _db_rankings(db)
+    return sorted(rows, key=lambda r: r["aqi"], reverse=True)[:limit]
+
+
+# ── Helper ────────────────────────────────────────────────────────────────────
+
+def _live_rankings(request: Request) -> list:
+    """
+    One row per city from the in-process live state: pollutants averaged over
+    the city's fresh stations, weather from the latest published record.
+    Empty when the state is missing or stale, so callers fall back to Postgres.
+    """
+    state = getattr(request.app.state, "live_state", None)
+    if state is None:
+        return []
+    rows = []
+    for city_id, agg in state.city_aggregates().items():
+        city = state.cities.get(city_id, {})
+        weather = state.weather.get(city_id, {})
+        rows.append({
+            "city_id": city_id,
+            "city": city.get("display_name"),
+            "country_code": city.get("country_code"),
+            "aqi": round(agg["aqi"]),
+            "health_category": classify_aqi(agg["aqi"]),
+            "pm25": round(agg["pm25"], 2),
+            "pm10": round(agg["pm10"], 2),
+            "no2": round(agg["no2"], 2),
+            "o3": round(agg["o3"], 2),
+            "temp": weather.get("temp"),
+            "humidity": weather.get("humidity"),
+            "wind_speed": weather.get("wind_speed"),
+            "uv_index": weather.get("uv_index"),
+            "recorded_at": agg["recorded_at"],
+        })
+    return rows
+
+
+async def _db_rankings(db: AsyncSession) -> list:
+    """
+    The same rows from station_latest when the live state is unavailable:
+    pollutants averaged over each city's stations, as in _live_rankings, so
+    both paths rank cities alike.
+    """
     result = await db.execute(
         text("""
-            SELECT DISTINCT ON (h.city_id)
+            SELECT
                 h.city_id,
                 cr.display_name AS city,
                 cr.country_code,
-                h.aqi,
-                h.health_category,
-                h.pm25,
-                h.pm10,
-                h.no2,
-                h.o3,
-                h.recorded_at
-            FROM station_aqi_history h
+                AVG(h.aqi)  AS aqi,
+                AVG(h.pm25) AS pm25,
+                AVG(h.pm10) AS pm10,
+                AVG(h.no2)  AS no2,
+                AVG(h.o3)   AS o3,
+                -- Weather is per city; stations without it joined yet have 0
+                AVG(h.temp) FILTER (WHERE h.temp <> 0)                         AS temp,
+                ROUND(AVG(h.humidity) FILTER (WHERE h.temp <> 0))::int         AS humidity,
+                AVG(h.wind_speed) FILTER (WHERE h.temp <> 0)                   AS wind_speed,
+                AVG(h.uv_index) FILTER (WHERE h.temp <> 0)                     AS uv_index,
+                MAX(h.recorded_at) AS recorded_at
+            FROM station_latest h
             JOIN city_registry cr ON cr.id = h.city_id
             WHERE h.aqi IS NOT NULL
-              AND h.diff = 1
-            ORDER BY h.city_id, h.recorded_at DESC NULLS LAST
+            GROUP BY h.city_id, cr.display_name, cr.country_code
         """)
     )
-    rows = result.mappings().all()
-
-    sorted_rows = sorted(rows, key=lambda r: r["aqi"] or 0, reverse=True)[:limit]
-    return [dict(r) for r in sorted_rows]
-
+    return [
+        {
+            "city_id": r["city_id"],
+            "city": r["city"],
+            "country_code": r["country_code"],
+            "aqi": round(r["aqi"]),
+            "health_category": classify_aqi(r["aqi"]),
+            "pm25": round(r["pm25"] or 0, 2),
+            "pm10": round(r["pm10"] or 0, 2),
+            "no2": round(r["no2"] or 0, 2),
+            "o3": round(r["o3"] or 0, 2),
+            "temp": r["temp"],
+            "humidity": r["humidity"],
+            "wind_speed": r["wind_speed"],
+            "uv_index": r["uv_index"],
+            "recorded_at": r["recorded_at"],
+        }
+        for r in result.mappings().all()
+    ]
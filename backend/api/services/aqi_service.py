@@ -1,20 +1,70 @@
 """
 api/services/aqi_service.py — Business logic for AQI data processing.
-Currently provides the Year-over-Year insight computation.
+Provides city time zones and the Year-over-Year insight computation
+(AQI categories live in pathway_pipeline/aqi_summary.py).
 """
 
-from datetime import datetime, timezone
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
+from api.core.config import settings
 
 
 ORDINALS = {1: "1st", 2: "2nd", 3: "3rd"}
 
+# Calendar years a city has data for: two primary-key lookups on the daily
+# rollup. Queries join per-year date ranges against it, so they read only the
+# rollup rows they return.
+CITY_YEARS_SQL = """
+    generate_series(
+        (SELECT EXTRACT(YEAR FROM MIN(day))::int FROM city_aqi_daily WHERE city_id = :city_id),
+        (SELECT EXTRACT(YEAR FROM MAX(day))::int FROM city_aqi_daily WHERE city_id = :city_id)
+    ) AS y
+"""
+
+
+# city_id -> IANA zone; history days and hours are local to the city
+_CITY_TZ: dict = {}
+
+
+async def city_timezone(db: AsyncSession, city_id: int) -> str:
+    """The city's zone from city_registry (cached in-process); UTC for unknown cities."""
+    if city_id not in _CITY_TZ:
+        result = await db.execute(
+            text("SELECT timezone FROM city_registry WHERE id = :city_id"), {"city_id": city_id}
+        )
+        tz = result.scalar()
+        if tz is None:
+            return "UTC"
+        _CITY_TZ[city_id] = tz
+    return _CITY_TZ[city_id]
+
 
-async def get_yoy_insight(city_id: int, db: AsyncSession) -> dict:
+async def yoy_day_averages(db: AsyncSession, city_id: int, month: int, day: int) -> list:
+    """
+    Average AQI on the given local calendar day for every year with data,
+    worst first: one index range scan of city_day_of_year_stats, which also
+    covers archived months. 29 Feb only has rows for leap years.
+    """
+    result = await db.execute(
+        text("""
+            SELECT year, ROUND(avg_aqi)::int AS avg_aqi
+            FROM city_day_of_year_stats
+            WHERE city_id = :city_id AND month = :month AND day = :day
+            ORDER BY avg_aqi DESC
+        """),
+        {"city_id": city_id, "month": month, "day": day},
+    )
+    return [dict(r) for r in result.mappings().all()]
+
+
+async def get_yoy_insight(city_id: int, db: AsyncSession, redis=None) -> dict:
     """
     Compares today's AQI against the same calendar day across all years
-    available in station_aqi_history.
+    available in the history. Cached in Redis per city and local day for
+    YOY_CACHE_TTL_S, so the Dashboard card is usually a single GET.
 
     Returns:
         - insight: pre-built English sentence  (None if <2 years of data)
@@ -23,33 +73,33 @@ async def get_yoy_insight(city_id: int, db: AsyncSession) -> dict:
         - worst: {year, aqi}
         - best:  {year, aqi}
     """
-    today = datetime.now(tz=timezone.utc)
+    today = datetime.now(tz=ZoneInfo(await city_timezone(db, city_id)))
     month, day = today.month, today.day
+    cache_key = f"yoy:{city_id}:{today:%Y-%m-%d}"
+    if redis is not None:
+        try:
+            cached = await redis.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except Exception:
+            pass
+
+    result = _yoy_insight(await yoy_day_averages(db, city_id, month, day), today.year)
+    if redis is not None:
+        try:
+            await redis.setex(cache_key, settings.YOY_CACHE_TTL_S, json.dumps(result))
+        except Exception:
+            pass
+    return result
 
-    result = await db.execute(
-        text("""
-            SELECT
-                EXTRACT(YEAR FROM recorded_at::timestamp)::int AS year,
-                ROUND(AVG(aqi))::int                           AS avg_aqi
-            FROM station_aqi_history
-            WHERE city_id = :city_id
-              AND diff = 1
-              AND aqi IS NOT NULL
-              AND EXTRACT(MONTH FROM recorded_at::timestamp) = :month
-              AND EXTRACT(DAY   FROM recorded_at::timestamp) = :day
-            GROUP BY year
-            ORDER BY avg_aqi DESC
-        """),
-        {"city_id": city_id, "month": month, "day": day},
-    )
-    rows = result.mappings().all()
 
+def _yoy_insight(rows: list, current_year: int) -> dict:
+    """Builds the insight payload from yoy_day_averages rows (worst first)."""
     if not rows or len(rows) < 2:
         return {"insight": None, "years_data": [], "current_rank": None,
                 "worst": None, "best": None}
 
     years_data    = [{"year": r["year"], "aqi": r["avg_aqi"]} for r in rows]
-    current_year  = today.year
     current_entry = next((r for r in years_data if r["year"] == current_year), None)
     rank          = (years_data.index(current_entry) + 1) if current_entry else None
     worst         = years_data[0]
@@ -0,0 +1,134 @@
+"""
+api/services/history_archive.py — Read path for the Parquet cold tier.
+
+archive_history.py moves closed months out of Postgres into
+HISTORY_ARCHIVE_DIR/city_id=<id>/year=<yyyy>/month=<m>/part-<run>.parquet, one
+row per raw reading or compacted station-hour (station_aqi_tiered's shape),
+and deletes the daily rollups of that calendar month in the same step.
+
+Days are the city's local days, as in the rollups. A partition month holds
+UTC-month rows, so a local day at a month edge can sit partly in the next or
+previous file; rows count here when their local day falls in an archived
+month, and in city_aqi_daily otherwise. So each day is either in
+city_aqi_daily or here, never both, and callers add the two together.
+
+Reads touch only the city's directory; year/month filters prune whole files
+and the recorded_ts filter skips row groups by their statistics. Without
+pyarrow, or with nothing archived, every function returns no rows.
+"""
+
+import asyncio
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+from api.core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # archive support is optional for the API
+    pa = None
+
+# Columns the daily aggregation needs
+_COLUMNS = ["recorded_ts", "sample_count", "aqi_avg", "aqi_min", "aqi_max"]
+
+
+def _city_dir(city_id: int) -> str:
+    return os.path.join(settings.HISTORY_ARCHIVE_DIR, f"city_id={city_id}")
+
+
+def archived_years(city_id: int) -> List[int]:
+    """Calendar years with at least one archived month for this city."""
+    try:
+        names = os.listdir(_city_dir(city_id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(n.split("=", 1)[1]) for n in names if n.startswith("year="))
+
+
+def _archived_months(city_id: int) -> Set[Tuple[int, int]]:
+    months = set()
+    for y in archived_years(city_id):
+        for name in os.listdir(os.path.join(_city_dir(city_id), f"year={y}")):
+            if name.startswith("month="):
+                months.add((y, int(name.split("=", 1)[1])))
+    return months
+
+
+def _daily(city_id: int, tz: str, start: Optional[date], end: Optional[date],
+           month: Optional[int], day: Optional[int]) -> List[dict]:
+    if pa is None:
+        return []
+    archived = _archived_months(city_id)
+    if not archived:
+        return []
+    zone = ZoneInfo(tz)
+    dataset = ds.dataset(
+        _city_dir(city_id),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("year", pa.int32()), ("month", pa.int32())]), flavor="hive"),
+    )
+    flt = pc.is_valid(ds.field("aqi_avg"))
+    if start is not None:
+        lo = datetime.combine(start, time(), zone).astimezone(timezone.utc)
+        flt &= ds.field("year") >= lo.year
+        flt &= ds.field("recorded_ts") >= pa.scalar(lo)
+    if end is not None:
+        hi = datetime.combine(end + timedelta(days=1), time(), zone).astimezone(timezone.utc)
+        flt &= ds.field("year") <= hi.year
+        flt &= ds.field("recorded_ts") < pa.scalar(hi)
+    if month is not None:
+        # The local month's edge days can sit in the neighbouring UTC-month files
+        flt &= ds.field("month").isin([(month - 2) % 12 + 1, month, month % 12 + 1])
+    table = dataset.to_table(columns=_COLUMNS, filter=flt)
+    if table.num_rows == 0:
+        return []
+
+    local = pc.local_timestamp(table["recorded_ts"].cast(pa.timestamp("us", tz=tz)))
+    days = pc.cast(local, pa.date32())
+    table = table.append_column("day", days).append_column(
+        "aqi_weighted", pc.multiply(table["aqi_avg"], pc.cast(table["sample_count"], pa.float64()))
+    )
+    # Only days of archived months; the rest are still in city_aqi_daily
+    month_key = pc.add(pc.multiply(pc.year(days), 100), pc.month(days))
+    keep = pc.is_in(month_key, value_set=pa.array([y * 100 + m for y, m in archived], type=month_key.type))
+    if month is not None:
+        keep = pc.and_(keep, pc.equal(pc.month(days), month))
+    if day is not None:
+        keep = pc.and_(keep, pc.equal(pc.day(days), day))
+    table = table.filter(keep)
+    if table.num_rows == 0:
+        return []
+    grouped = table.group_by("day").aggregate([
+        ("sample_count", "sum"),
+        ("aqi_weighted", "sum"),
+        ("aqi_min", "min"),
+        ("aqi_max", "max"),
+        ("recorded_ts", "min"),
+        ("recorded_ts", "max"),
+    ])
+    return [
+        {
+            "day": r["day"],
+            "sample_count": r["sample_count_sum"],
+            "aqi_sum": r["aqi_weighted_sum"],
+            "aqi_min": r["aqi_min_min"],
+            "aqi_max": r["aqi_max_max"],
+            "first_recorded_at": r["recorded_ts_min"],
+            "last_recorded_at": r["recorded_ts_max"],
+        }
+        for r in grouped.sort_by("day").to_pylist()
+    ]
+
+
+async def archived_daily(city_id: int, tz: str, start: Optional[date] = None, end: Optional[date] = None,
+                         month: Optional[int] = None, day: Optional[int] = None) -> List[dict]:
+    """
+    Archived days (local to `tz`, the city's zone) for a city in
+    city_aqi_daily's shape (sums, min/max, first/last reading), optionally
+    limited to [start, end] and/or a calendar month / day. Runs in a worker
+    thread.
+    """
+    return await asyncio.to_thread(_daily, city_id, tz, start, end, month, day)
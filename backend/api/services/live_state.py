@@ -0,0 +1,233 @@
+"""
+api/services/live_state.py — In-process table of the latest reading per station.
+Numeric values live in a NumPy structured array (one row per station, grouped
+by city) so city aggregates are vectorized. The Redis bridge keeps it current
+from the aqi:live:stream stream, and it is warm-loaded from Redis on startup.
+"""
+
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from api.core.db import AsyncSessionLocal
+
+POLLUTANTS = ("aqi", "pm25", "pm10", "no2", "o3", "co", "so2")
+
+STATION_DTYPE = np.dtype(
+    [("station_id", "i4"), ("city_id", "i4")]
+    + [(p, "f8") for p in POLLUTANTS]
+    + [("lat", "f8"), ("lon", "f8"), ("updated_at", "f8"), ("seq", "i8")]
+)
+
+WEATHER_FIELDS = ("temp", "feels_like", "humidity", "wind_speed",
+                  "uv_index", "precip_prob", "forecast_aqi_24h")
+
+
+class LiveStationState:
+    """
+    Latest reading per station. Rows without a reading have NaN pollutant
+    values; rows older than `max_age_s` are ignored by every read.
+    """
+
+    def __init__(self, max_age_s: float = 1800, capacity: int = 1024):
+        self.max_age_s = max_age_s
+        self._rows = np.zeros(capacity, dtype=STATION_DTYPE)
+        self._size = 0
+        self._index: Dict[int, int] = {}           # station_id -> row
+        self._city_rows: Dict[int, np.ndarray] = {}
+        self._names: List[str] = []                # row -> station_name
+        self._records: List[Optional[dict]] = []   # row -> last published record
+        self.cities: Dict[int, dict] = {}          # city_id -> {display_name, country_code}
+        self.weather: Dict[int, dict] = {}
+        self.weather_seq: Dict[int, int] = {}      # city_id -> seq of its last weather change
+        self.last_update = 0.0
+        self.head_seq = 0                          # highest pipeline sequence number seen
+
+    # ── Writes ───────────────────────────────────────────────────────────────
+
+    def _add_row(self, station_id: int, city_id: int, name: str = "",
+                 lat: float = 0.0, lon: float = 0.0) -> int:
+        if self._size == len(self._rows):
+            grown = np.zeros(len(self._rows) * 2, dtype=STATION_DTYPE)
+            grown[:self._size] = self._rows[:self._size]
+            self._rows = grown
+        i = self._size
+        self._size += 1
+        self._rows[i] = (station_id, city_id, *([np.nan] * len(POLLUTANTS)), lat or 0.0, lon or 0.0, 0.0, 0)
+        self._index[station_id] = i
+        self._names.append(name)
+        self._records.append(None)
+        self._city_rows[city_id] = np.append(self._city_rows.get(city_id, np.empty(0, dtype=np.intp)), i)
+        return i
+
+    def load_registry(self, stations, cities) -> None:
+        """Registers stations (id, city_id, name, lat, lon) and city names."""
+        for s in stations:
+            if s["id"] not in self._index:
+                self._add_row(s["id"], s["city_id"], s["station_name"], s["lat"], s["lon"])
+        for c in cities:
+            self.cities[c["id"]] = {"display_name": c["display_name"],
+                                    "country_code": c["country_code"]}
+
+    def update(self, record: dict, received_at: Optional[float] = None) -> None:
+        """Stores one live-stream record: a station reading or a city weather change."""
+        if record.get("type") == "weather":
+            self.update_weather(record)
+            return
+        station_id = int(record["station_id"])
+        city_id = int(record["city_id"])
+        i = self._index.get(station_id)
+        if i is None:
+            i = self._add_row(station_id, city_id, record.get("city", ""),
+                              record.get("lat", 0.0), record.get("lon", 0.0))
+        for p in POLLUTANTS:
+            self._rows[p][i] = record.get(p) or 0.0
+        now = received_at or time.time()
+        self._rows["updated_at"][i] = record.get("published_at") or now
+        self._records[i] = record
+        seq = int(record.get("seq") or 0)
+        self._rows["seq"][i] = seq
+        self.head_seq = max(self.head_seq, seq)
+        if record.get("temp"):
+            self._set_weather(city_id, {f: record.get(f, 0) for f in WEATHER_FIELDS}, seq)
+        self.last_update = now
+
+    def _set_weather(self, city_id: int, weather: dict, seq: int) -> None:
+        if self.weather.get(city_id) != weather:
+            self.weather[city_id] = weather
+            self.weather_seq[city_id] = max(self.weather_seq.get(city_id, 0), seq)
+
+    def update_weather(self, record: dict) -> None:
+        """New weather for a city, also copied into its stations' latest records."""
+        city_id = int(record["city_id"])
+        seq = int(record.get("seq") or 0)
+        weather = {f: record.get(f, 0) for f in WEATHER_FIELDS}
+        self._set_weather(city_id, weather, seq)
+        for i in self._city_rows.get(city_id, ()):
+            if self._records[i] is not None:
+                self._records[i] = {**self._records[i], **weather}
+        self.head_seq = max(self.head_seq, seq)
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+
+    def _fresh(self, rows: np.ndarray) -> np.ndarray:
+        return (rows["updated_at"] >= time.time() - self.max_age_s) & ~np.isnan(rows["aqi"])
+
+    def is_fresh(self) -> bool:
+        """False until the first update, and again once updates stop arriving."""
+        return self.last_update >= time.time() - self.max_age_s
+
+    def city_readings(self, city_id: int) -> Optional[List[dict]]:
+        """Latest published records of a city's fresh stations, or None."""
+        idx = self._city_rows.get(city_id)
+        if idx is None or not self.is_fresh():
+            return None
+        fresh = idx[self._fresh(self._rows[idx])]
+        if not len(fresh):
+            return None
+        return [self._records[i] for i in fresh]
+
+    def city_stations(self, city_id: int) -> Optional[List[dict]]:
+        """Every registered station of a city with its latest values, or None."""
+        idx = self._city_rows.get(city_id)
+        if idx is None or not self.is_fresh():
+            return None
+        rows = self._rows[idx]
+        fresh = self._fresh(rows)
+        if not fresh.any():
+            return None
+        out = []
+        for i, row, ok in zip(idx, rows, fresh):
+            out.append({
+                "id": int(row["station_id"]), "station_name": self._names[i],
+                "lat": float(row["lat"]), "lon": float(row["lon"]),
+                "aqi": float(row["aqi"]) if ok else None,
+                "pm25": float(row["pm25"]) if ok else None,
+                "pm10": float(row["pm10"]) if ok else None,
+                "health_category": self._records[i].get("health_category", "") if ok else None,
+            })
+        return out
+
+    def city_seq(self, city_id: int) -> int:
+        """Sequence number of the city's most recent reading (0 if none)."""
+        idx = self._city_rows.get(city_id)
+        return int(self._rows["seq"][idx].max()) if idx is not None and len(idx) else 0
+
+    def changes_since(self, since: int, city_id: Optional[int] = None) -> List[dict]:
+        """Latest records of stations (optionally of one city) with seq > `since`."""
+        if city_id is None:
+            idx = np.arange(self._size)
+        else:
+            idx = self._city_rows.get(city_id, np.empty(0, dtype=np.intp))
+        rows = self._rows[idx]
+        changed = idx[(rows["seq"] > since) & self._fresh(rows)]
+        return [self._records[i] for i in changed[np.argsort(self._rows["seq"][changed])]]
+
+    def weather_since(self, since: int, city_id: Optional[int] = None) -> List[dict]:
+        """Current weather of cities (optionally one) whose weather changed after `since`."""
+        return [
+            {"city_id": c, **self.weather[c]}
+            for c, seq in self.weather_seq.items()
+            if seq > since and (city_id is None or c == city_id)
+        ]
+
+    def city_aggregates(self) -> Dict[int, dict]:
+        """
+        Per-city station count, mean of every pollutant over fresh stations
+        (one bincount per column) and the most recent `recorded_at`.
+        """
+        if not self.is_fresh():
+            return {}
+        rows = self._rows[:self._size]
+        fresh_idx = np.flatnonzero(self._fresh(rows))
+        if not len(fresh_idx):
+            return {}
+        rows = rows[fresh_idx]
+        cids = rows["city_id"]
+        counts = np.bincount(cids)
+        means = {p: np.bincount(cids, weights=rows[p]) / np.maximum(counts, 1) for p in POLLUTANTS}
+
+        # Newest row per city: sort by (city, updated_at) and take each group's tail
+        order = np.lexsort((rows["updated_at"], cids))
+        tails = order[np.r_[cids[order][1:] != cids[order][:-1], True]]
+        newest = {int(cids[t]): self._records[fresh_idx[t]] for t in tails}
+
+        return {
+            int(c): {
+                "station_count": int(counts[c]),
+                **{p: float(means[p][c]) for p in POLLUTANTS},
+                "recorded_at": newest[int(c)].get("recorded_at"),
+            }
+            for c in np.flatnonzero(counts)
+        }
+
+
+async def warm_load(state: LiveStationState, redis) -> None:
+    """Rebuilds the state from the registry and the station:*:latest keys."""
+    async with AsyncSessionLocal() as db:
+        stations = (await db.execute(text(
+            "SELECT id, city_id, station_name, lat, lon FROM city_stations"
+        ))).mappings().all()
+        cities = (await db.execute(text(
+            "SELECT id, display_name, country_code FROM city_registry"
+        ))).mappings().all()
+    state.load_registry(
+        [{**s, "lat": float(s["lat"] or 0), "lon": float(s["lon"] or 0)} for s in stations],
+        cities,
+    )
+    if not stations:
+        return
+    raws = await redis.mget([f"station:{s['id']}:latest" for s in stations])
+    loaded = 0
+    for raw in raws:
+        if raw:
+            state.update(json.loads(raw))
+            loaded += 1
+    # Newest weather per city, which may postdate the stations' readings
+    for raw in await redis.mget([f"weather:{c['id']}" for c in cities]):
+        if raw:
+            state.update_weather(json.loads(raw))
+    print(f"Live state warm-loaded {loaded}/{len(stations)} stations from Redis")
@@ -1,31 +1,277 @@
 import asyncio
 import json
+import os
+import socket
+import uuid
+from collections import defaultdict
 import redis.asyncio as aioredis
 from api.core.config import settings
+from api.services.live_state import warm_load
 
+# Capped stream the pipeline appends every published reading to
+STREAM_KEY = "aqi:live:stream"
+GROUP = "aqi:bridge"
 
-async def redis_to_socket_bridge(sio):
+# Extend / release the lock only while it still holds our token
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def city_room(city_id) -> str:
+    return f"city:{city_id}"
+
+
+def station_room(station_id) -> str:
+    return f"station:{station_id}"
+
+
+class LiveUpdateCoalescer:
     """
-    Bridge that listens to Redis Pub/Sub and broadcasts to Socket.IO.
+    Collects live updates for `window_s` seconds, keeps only the latest per
+    station, then emits one `aqi_batch` frame per city. A polling cycle's burst
+    of per-station messages becomes a handful of frames. City weather changes
+    are kept per city and sent to the city's room as `aqi_weather` frames.
     """
-    print("Starting Redis to Socket.IO bridge...")
-    redis_client = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-    pubsub = redis_client.pubsub()
-    await pubsub.subscribe("aqi:live")
 
-    try:
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                try:
-                    data = json.loads(message["data"])
-                    # Broadcast to all connected Socket.IO clients
-                    await sio.emit("aqi_update", data)
-                    print(f"Broadcasted update for {data.get('city')}")
+    def __init__(self, sio, window_s: float = 0.25):
+        self.sio = sio
+        self.window_s = window_s
+        self._pending = {}          # station_id -> latest record
+        self._weather = {}          # city_id -> latest weather event
+        self.messages_in = 0
+        self.messages_out = 0
+
+    def add(self, data: dict) -> None:
+        self.messages_in += 1
+        if data.get("type") == "weather":
+            self._weather[data.get("city_id")] = data
+        else:
+            self._pending[data.get("station_id")] = data
+
+    async def flush(self) -> None:
+        if self._weather:
+            weather, self._weather = self._weather, {}
+            for city_id, w in weather.items():
+                await self.sio.emit("aqi_weather", {"city_id": city_id, "weather": w}, to=city_room(city_id))
+                self.messages_out += 1
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        by_city = defaultdict(list)
+        for record in batch.values():
+            by_city[record.get("city_id")].append(record)
+        for city_id, updates in by_city.items():
+            # Station-room subscribers get their city's frame (deduplicated per client)
+            rooms = [city_room(city_id)] + [station_room(u.get("station_id")) for u in updates]
+            await self.sio.emit("aqi_batch", {"city_id": city_id, "updates": updates}, to=rooms)
+            self.messages_out += 1
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.window_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error emitting live batch: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "coalescing_ratio": round(self.messages_in / self.messages_out, 2) if self.messages_out else None,
+            "pending": len(self._pending) + len(self._weather),
+            "window_ms": int(self.window_s * 1000),
+        }
+
+
+class BridgeLeaderLock:
+    """
+    Redis lock that elects the one worker allowed to emit live updates when
+    several API workers share a Socket.IO message queue. The holder renews it
+    every ttl/3; if it dies, another worker takes over within `ttl_s`.
+    """
+
+    KEY = "aqi:bridge:leader"
+
+    def __init__(self, redis, ttl_s: float = 15):
+        self.redis = redis
+        self.ttl_ms = int(ttl_s * 1000)
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if self.is_leader:
+                    self.is_leader = bool(await self.redis.eval(_RENEW_LUA, 1, self.KEY, self.token, self.ttl_ms))
+                else:
+                    self.is_leader = bool(await self.redis.set(self.KEY, self.token, nx=True, px=self.ttl_ms))
+                    if self.is_leader:
+                        print(f"Bridge leadership acquired by {self.token}")
+            except Exception as e:
+                self.is_leader = False
+                print(f"Bridge leader lock error: {e}")
+            await asyncio.sleep(self.ttl_ms / 3000)
+
+    async def release(self) -> None:
+        if self.is_leader:
+            self.is_leader = False
+            await self.redis.eval(_RELEASE_LUA, 1, self.KEY, self.token)
+
+
+def _id_ms(entry_id: str) -> int:
+    """Milliseconds part of a stream entry ID."""
+    return int(entry_id.split("-")[0])
 
+
+def _id(entry_id: str) -> tuple:
+    """A stream entry ID as a comparable (ms, seq) pair."""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+async def latest_stream_id(redis) -> str:
+    """ID of the newest entry in the live stream, or 0-0 if it is empty."""
+    entries = await redis.xrevrange(STREAM_KEY, count=1)
+    return entries[0][0] if entries else "0-0"
+
+
+class StreamFollower:
+    """
+    Tails the live stream into this worker's in-process state. It remembers
+    the last entry it applied, so after a Redis disconnect it resumes from
+    there and replays what it missed. Every read also checks whether entries
+    after that one have been trimmed from the capped stream (the follower
+    fell more than the cap behind, or was disconnected that long); if so it
+    warm-loads the state again instead.
+    """
+
+    def __init__(self, live_state, last_id: str = "0-0"):
+        self.live_state = live_state
+        self.last_id = last_id
+
+    async def _trimmed(self, redis) -> bool:
+        """True if entries newer than last_id were trimmed before we read them."""
+        try:
+            info = await redis.xinfo_stream(STREAM_KEY)
+        except aioredis.ResponseError:
+            return False                # no stream yet
+        deleted = info.get("max-deleted-entry-id")
+        if deleted is not None:
+            return _id(deleted) > _id(self.last_id)
+        # Before Redis 7: the oldest entry left is newer than ours
+        first = info.get("first-entry")
+        return bool(first) and _id(first[0]) > _id(self.last_id)
+
+    async def _resync_if_trimmed(self, redis) -> bool:
+        if not await self._trimmed(redis):
+            return False
+        print("Live stream trimmed past our last ID; warm-loading state")
+        self.last_id = await latest_stream_id(redis)
+        await warm_load(self.live_state, redis)
+        return True
+
+    async def run(self) -> None:
+        redis_client = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        try:
+            while True:
+                try:
+                    resp = await redis_client.xread({STREAM_KEY: self.last_id}, count=500, block=5000)
+                    # Checked after the read, still against last_id: trimming only removes
+                    # the oldest entries, so a read that started past a gap is caught here
+                    if await self._resync_if_trimmed(redis_client):
+                        continue
+                    for _, entries in resp or []:
+                        for entry_id, fields in entries:
+                            self.live_state.update(json.loads(fields["data"]))
+                            self.last_id = entry_id
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    print(f"Error processing Redis message: {e}")
+                    print(f"Live stream read failed, resuming from {self.last_id}: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            await redis_client.close()
+
+
+async def stream_to_socket_bridge(coalescer: LiveUpdateCoalescer, leader=None):
+    """
+    Reads the live stream through the `aqi:bridge` consumer group and forwards
+    updates to Socket.IO through the coalescer. The group tracks the last
+    delivered entry in Redis, so a new bridge (or a new leader, when a
+    `leader` lock is given) continues where the previous one stopped, and
+    first claims entries the previous consumer read but never acknowledged.
+    """
+    print("Starting Redis stream to Socket.IO bridge...")
+    redis_client = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    consumer = leader.token if leader else f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        await redis_client.xgroup_create(STREAM_KEY, GROUP, id="$", mkstream=True)
+    except aioredis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+    flusher = asyncio.create_task(coalescer.run())
+    active = False
+
+    try:
+        while True:
+            if leader is not None and not leader.is_leader:
+                active = False
+                await asyncio.sleep(1)
+                continue
+            try:
+                entries = []
+                if not active:
+                    # Taking over: pick up what the previous consumer left pending
+                    _, entries, *_ = await redis_client.xautoclaim(
+                        STREAM_KEY, GROUP, consumer, min_idle_time=10_000, count=500
+                    )
+                    active = True
+                resp = await redis_client.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=500, block=2000)
+                for _, new_entries in resp or []:
+                    entries.extend(new_entries)
+                for _, fields in entries:
+                    coalescer.add(json.loads(fields["data"]))
+                if entries:
+                    await redis_client.xack(STREAM_KEY, GROUP, *[entry_id for entry_id, _ in entries])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error processing live stream: {e}")
+                await asyncio.sleep(1)
     except asyncio.CancelledError:
         print("Redis bridge cancelled.")
     finally:
-        await pubsub.unsubscribe("aqi:live")
+        flusher.cancel()
+        try:
+            await redis_client.xgroup_delconsumer(STREAM_KEY, GROUP, consumer)
+        except Exception:
+            pass
         await redis_client.close()
+
+
+async def stream_metrics(redis, follower: StreamFollower = None) -> dict:
+    """Stream length, consumer-group lag and this worker's follower lag."""
+    info = await redis.xinfo_stream(STREAM_KEY)
+    last_id = info["last-generated-id"]
+    group = next((g for g in await redis.xinfo_groups(STREAM_KEY) if g["name"] == GROUP), {})
+    out = {
+        "length": info["length"],
+        "last_id": last_id,
+        "group_lag": group.get("lag"),
+        "group_pending": group.get("pending"),
+    }
+    if follower is not None:
+        out["follower_last_id"] = follower.last_id
+        out["follower_lag_ms"] = max(0, _id_ms(last_id) - _id_ms(follower.last_id))
+    return out
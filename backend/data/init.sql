@@ -5,7 +5,10 @@ CREATE TABLE IF NOT EXISTS city_registry (
     waqi_slug VARCHAR(100) UNIQUE NOT NULL,
     lat DECIMAL(9,6) NOT NULL,
     lon DECIMAL(9,6) NOT NULL,
-    country_code CHAR(2) NOT NULL
+    country_code CHAR(2) NOT NULL,
+    -- IANA zone of the city's stations; history rollups bucket hours and days
+    -- in it (all seeded cities are in India)
+    timezone TEXT NOT NULL DEFAULT 'Asia/Kolkata'
 );
 
 -- City Stations
@@ -18,9 +21,31 @@ CREATE TABLE IF NOT EXISTS city_stations (
     lon DECIMAL(9,6)
 );
 
--- Station AQI History
+-- Tell the pipeline's registry cache (pathway_pipeline/city_loader.py) to
+-- reload when cities or stations change, instead of it re-reading both tables
+-- every polling cycle.
+CREATE OR REPLACE FUNCTION notify_registry_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('registry_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_city_registry_notify ON city_registry;
+CREATE TRIGGER trg_city_registry_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON city_registry
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_registry_change();
+
+DROP TRIGGER IF EXISTS trg_city_stations_notify ON city_stations;
+CREATE TRIGGER trg_city_stations_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON city_stations
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_registry_change();
+
+-- Station AQI History, range-partitioned by month on recorded_ts so old
+-- months are dropped (or archived) whole instead of DELETEd, and time-bounded
+-- queries only touch the partitions they need. See maintain_partitions.py.
 CREATE TABLE IF NOT EXISTS station_aqi_history (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     city_id INTEGER REFERENCES city_registry(id),
     station_id INTEGER REFERENCES city_stations(id),
     aqi FLOAT8,
@@ -30,6 +55,282 @@ CREATE TABLE IF NOT EXISTS station_aqi_history (
     o3 FLOAT8 DEFAULT 0,
     co FLOAT8 DEFAULT 0,
     so2 FLOAT8 DEFAULT 0,
+    health_category TEXT DEFAULT '',
+    recorded_at TEXT,
+    -- Parsed recorded_at, supplied by the writers; all time filters use this
+    recorded_ts TIMESTAMPTZ NOT NULL,
+    time BIGINT NOT NULL,
+    diff SMALLINT NOT NULL,
+    PRIMARY KEY (id, recorded_ts)
+) PARTITION BY RANGE (recorded_ts);
+CREATE INDEX IF NOT EXISTS idx_sah_station_ts ON station_aqi_history(station_id, recorded_ts DESC) WHERE diff = 1;
+CREATE INDEX IF NOT EXISTS idx_sah_city_time ON station_aqi_history(city_id, time DESC);
+-- Phase 4: historical analysis index. Every history query filters live rows
+-- (diff = 1) of one city by a recorded_ts range and aggregates aqi.
+CREATE INDEX IF NOT EXISTS idx_sah_city_ts ON station_aqi_history(city_id, recorded_ts)
+    INCLUDE (aqi, station_id) WHERE diff = 1;
+
+-- Monthly partitions (UTC months), named station_aqi_history_yYYYYmMM.
+-- Creates any missing partition for the months p_from .. p_to (inclusive).
+CREATE OR REPLACE FUNCTION ensure_history_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    m DATE := date_trunc('month', p_from)::date;
+    created INTEGER := 0;
+    part TEXT;
+BEGIN
+    WHILE m <= p_to LOOP
+        part := format('station_aqi_history_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF station_aqi_history FOR VALUES FROM (%L) TO (%L)',
+                part, m::timestamp AT TIME ZONE 'UTC', (m + INTERVAL '1 month') AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Monthly partitions that end on or before p_before, oldest first.
+CREATE OR REPLACE FUNCTION history_partitions_before(p_before DATE)
+RETURNS TABLE (partition_name TEXT, month DATE) AS $$
+    SELECT c.relname::text, to_date(right(c.relname, 8), '"y"YYYY"m"MM')
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'station_aqi_history'::regclass
+      AND c.relname ~ '^station_aqi_history_y[0-9]{4}m[0-9]{2}$'
+      AND to_date(right(c.relname, 8), '"y"YYYY"m"MM') + INTERVAL '1 month' <= p_before
+    ORDER BY 2;
+$$ LANGUAGE sql STABLE;
+
+-- Catch-all for readings outside every monthly partition (bad clocks); kept
+-- empty in normal operation, maintain_partitions.py reports it if not.
+CREATE TABLE IF NOT EXISTS station_aqi_history_default PARTITION OF station_aqi_history DEFAULT;
+-- Three years back (seed_historical.py's range) to three months ahead
+SELECT ensure_history_partitions((now() - INTERVAL '36 months')::date, (now() + INTERVAL '3 months')::date);
+
+-- Hourly per-station aggregates of raw readings older than
+-- HISTORY_COMPACT_AFTER_DAYS, written by compact_history.py. The raw rows of
+-- a compacted month are truncated; station_aqi_tiered reads both tiers.
+CREATE TABLE IF NOT EXISTS station_aqi_hourly (
+    station_id INTEGER NOT NULL REFERENCES city_stations(id) ON DELETE CASCADE,
+    city_id INTEGER REFERENCES city_registry(id),
+    bucket TIMESTAMPTZ NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_avg FLOAT8,  aqi_min FLOAT8,  aqi_max FLOAT8,
+    pm25_avg FLOAT8, pm25_min FLOAT8, pm25_max FLOAT8,
+    pm10_avg FLOAT8, pm10_min FLOAT8, pm10_max FLOAT8,
+    no2_avg FLOAT8,  no2_min FLOAT8,  no2_max FLOAT8,
+    o3_avg FLOAT8,   o3_min FLOAT8,   o3_max FLOAT8,
+    co_avg FLOAT8,   co_min FLOAT8,   co_max FLOAT8,
+    so2_avg FLOAT8,  so2_min FLOAT8,  so2_max FLOAT8,
+    PRIMARY KEY (station_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_sah_hourly_city ON station_aqi_hourly(city_id, bucket);
+
+-- Raw live rows and compacted hours in one shape; a raw row is an "hour" of
+-- one sample. The two tiers never overlap in time for a station.
+CREATE OR REPLACE VIEW station_aqi_tiered AS
+    SELECT station_id, city_id, recorded_ts, recorded_at, time, 1 AS sample_count,
+           aqi  AS aqi_avg,  aqi  AS aqi_min,  aqi  AS aqi_max,
+           pm25 AS pm25_avg, pm25 AS pm25_min, pm25 AS pm25_max,
+           pm10 AS pm10_avg, pm10 AS pm10_min, pm10 AS pm10_max,
+           no2  AS no2_avg,  no2  AS no2_min,  no2  AS no2_max,
+           o3   AS o3_avg,   o3   AS o3_min,   o3   AS o3_max,
+           co   AS co_avg,   co   AS co_min,   co   AS co_max,
+           so2  AS so2_avg,  so2  AS so2_min,  so2  AS so2_max,
+           health_category
+    FROM station_aqi_history
+    WHERE diff = 1
+    UNION ALL
+    SELECT station_id, city_id, bucket,
+           to_char(bucket AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"+00:00"'),
+           (EXTRACT(EPOCH FROM bucket) * 1000)::bigint, sample_count,
+           aqi_avg,  aqi_min,  aqi_max,
+           pm25_avg, pm25_min, pm25_max,
+           pm10_avg, pm10_min, pm10_max,
+           no2_avg,  no2_min,  no2_max,
+           o3_avg,   o3_min,   o3_max,
+           co_avg,   co_min,   co_max,
+           so2_avg,  so2_min,  so2_max,
+           NULL
+    FROM station_aqi_hourly;
+
+-- Months moved to the Parquet archive by archive_history.py, one row per run.
+-- A run's files are published only once its row is committed.
+CREATE TABLE IF NOT EXISTS history_parquet_runs (
+    run_id TEXT PRIMARY KEY,
+    month DATE NOT NULL,
+    row_count BIGINT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Hourly / daily city rollups of live history rows (diff = 1), bucketed in
+-- the city's local time (city_registry.timezone), like the readings' own
+-- wall-clock time.
+-- Maintained by trg_sah_rollup on every insert; the history endpoints read
+-- these instead of aggregating raw rows. Averages are *_sum / sample_count.
+CREATE TABLE IF NOT EXISTS city_aqi_hourly (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    bucket TIMESTAMPTZ NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    pm25_sum FLOAT8 NOT NULL DEFAULT 0,
+    pm10_sum FLOAT8 NOT NULL DEFAULT 0,
+    no2_sum FLOAT8 NOT NULL DEFAULT 0,
+    o3_sum FLOAT8 NOT NULL DEFAULT 0,
+    co_sum FLOAT8 NOT NULL DEFAULT 0,
+    so2_sum FLOAT8 NOT NULL DEFAULT 0,
+    PRIMARY KEY (city_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS city_aqi_daily (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    pm25_sum FLOAT8 NOT NULL DEFAULT 0,
+    pm10_sum FLOAT8 NOT NULL DEFAULT 0,
+    no2_sum FLOAT8 NOT NULL DEFAULT 0,
+    o3_sum FLOAT8 NOT NULL DEFAULT 0,
+    co_sum FLOAT8 NOT NULL DEFAULT 0,
+    so2_sum FLOAT8 NOT NULL DEFAULT 0,
+    first_recorded_at TIMESTAMPTZ,
+    last_recorded_at TIMESTAMPTZ,
+    PRIMARY KEY (city_id, day)
+);
+
+-- Per city and local calendar day, one row per year: what the YoY card and
+-- /history/.../yoy-day read with a single index range scan. Maintained by
+-- trg_sah_rollup alongside the rollups, and kept when months are archived.
+CREATE TABLE IF NOT EXISTS city_day_of_year_stats (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    month SMALLINT NOT NULL,
+    day SMALLINT NOT NULL,
+    year SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    avg_aqi FLOAT8 GENERATED ALWAYS AS (aqi_sum / sample_count) STORED,
+    PRIMARY KEY (city_id, month, day, year)
+);
+
+-- Statement-level, so a batch insert costs one upsert per touched bucket
+CREATE OR REPLACE FUNCTION rollup_city_aqi() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO city_aqi_hourly AS r
+        (city_id, bucket, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum)
+    SELECT city_id, date_trunc('hour', recorded_ts, c.timezone), COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, bucket) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum;
+
+    INSERT INTO city_aqi_daily AS r
+        (city_id, day, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum,
+         first_recorded_at, last_recorded_at)
+    SELECT city_id, (recorded_ts AT TIME ZONE c.timezone)::date, COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0),
+           MIN(recorded_ts), MAX(recorded_ts)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, day) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum,
+        first_recorded_at = LEAST(r.first_recorded_at, EXCLUDED.first_recorded_at),
+        last_recorded_at  = GREATEST(r.last_recorded_at, EXCLUDED.last_recorded_at);
+
+    INSERT INTO city_day_of_year_stats AS r
+        (city_id, month, day, year, sample_count, aqi_sum, aqi_min, aqi_max)
+    SELECT city_id,
+           EXTRACT(MONTH FROM recorded_ts AT TIME ZONE c.timezone),
+           EXTRACT(DAY   FROM recorded_ts AT TIME ZONE c.timezone),
+           EXTRACT(YEAR  FROM recorded_ts AT TIME ZONE c.timezone),
+           COUNT(*), SUM(aqi), MIN(aqi), MAX(aqi)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (city_id, month, day, year) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum = r.aqi_sum + EXCLUDED.aqi_sum,
+        aqi_min = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max = GREATEST(r.aqi_max, EXCLUDED.aqi_max);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sah_rollup ON station_aqi_history;
+CREATE TRIGGER trg_sah_rollup
+    AFTER INSERT ON station_aqi_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_city_aqi();
+
+-- City weather and AQI forecast, one row per city per pipeline cycle (not per
+-- station reading). recorded_ts is when the row was fetched; recorded_at is
+-- Open-Meteo's local observation time.
+CREATE TABLE IF NOT EXISTS city_weather_history (
+    id BIGSERIAL PRIMARY KEY,
+    city_id INTEGER REFERENCES city_registry(id),
+    temp FLOAT8 DEFAULT 0,
+    feels_like FLOAT8 DEFAULT 0,
+    humidity INTEGER DEFAULT 0,
+    wind_speed FLOAT8 DEFAULT 0,
+    uv_index FLOAT8 DEFAULT 0,
+    precip_prob INTEGER DEFAULT 0,
+    forecast_aqi_24h TEXT DEFAULT '[]',
+    recorded_at TEXT,
+    recorded_ts TIMESTAMPTZ NOT NULL,
+    time BIGINT NOT NULL,
+    diff SMALLINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cwh_city_ts ON city_weather_history(city_id, recorded_ts DESC);
+
+-- Latest reading per station (upserted by the pipeline's snapshot sink).
+-- Serves every "latest" DB fallback with one indexed query.
+CREATE TABLE IF NOT EXISTS station_latest (
+    station_id INTEGER PRIMARY KEY REFERENCES city_stations(id) ON DELETE CASCADE,
+    city_id INTEGER REFERENCES city_registry(id),
+    aqi FLOAT8,
+    pm25 FLOAT8,
+    pm10 FLOAT8,
+    no2 FLOAT8 DEFAULT 0,
+    o3 FLOAT8 DEFAULT 0,
+    co FLOAT8 DEFAULT 0,
+    so2 FLOAT8 DEFAULT 0,
     lat FLOAT8 DEFAULT 0,
     lon FLOAT8 DEFAULT 0,
     health_category TEXT DEFAULT '',
@@ -43,11 +344,7 @@ CREATE TABLE IF NOT EXISTS station_aqi_history (
     time BIGINT NOT NULL,
     diff SMALLINT NOT NULL
 );
-CREATE INDEX IF NOT EXISTS idx_sah_station_time ON station_aqi_history(station_id, time DESC);
-CREATE INDEX IF NOT EXISTS idx_sah_city_time ON station_aqi_history(city_id, time DESC);
--- Phase 4: historical analysis indexes
-CREATE INDEX IF NOT EXISTS idx_sah_city_recorded ON station_aqi_history(city_id, recorded_at);
-CREATE INDEX IF NOT EXISTS idx_sah_city_diff_recorded ON station_aqi_history(city_id, diff, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_sl_city ON station_latest(city_id);
 
 -- Users (references city_registry, so must come after it)
 CREATE TABLE IF NOT EXISTS users (
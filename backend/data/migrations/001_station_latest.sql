@@ -0,0 +1,45 @@
+-- 001_station_latest.sql — Latest-reading-per-station table for existing databases.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/001_station_latest.sql
+
+CREATE TABLE IF NOT EXISTS station_latest (
+    station_id INTEGER PRIMARY KEY REFERENCES city_stations(id) ON DELETE CASCADE,
+    city_id INTEGER REFERENCES city_registry(id),
+    aqi FLOAT8,
+    pm25 FLOAT8,
+    pm10 FLOAT8,
+    no2 FLOAT8 DEFAULT 0,
+    o3 FLOAT8 DEFAULT 0,
+    co FLOAT8 DEFAULT 0,
+    so2 FLOAT8 DEFAULT 0,
+    lat FLOAT8 DEFAULT 0,
+    lon FLOAT8 DEFAULT 0,
+    health_category TEXT DEFAULT '',
+    temp FLOAT8 DEFAULT 0,
+    humidity INTEGER DEFAULT 0,
+    wind_speed FLOAT8 DEFAULT 0,
+    uv_index FLOAT8 DEFAULT 0,
+    precip_prob INTEGER DEFAULT 0,
+    forecast_aqi_24h TEXT DEFAULT '[]',
+    recorded_at TEXT,
+    time BIGINT NOT NULL,
+    diff SMALLINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sl_city ON station_latest(city_id);
+
+-- Seed from history so fallbacks work before the pipeline's next cycle
+INSERT INTO station_latest
+    (station_id, city_id, aqi, pm25, pm10, no2, o3, co, so2, lat, lon,
+     health_category, temp, humidity, wind_speed, uv_index, precip_prob,
+     forecast_aqi_24h, recorded_at, time, diff)
+SELECT DISTINCT ON (station_id)
+    station_id, city_id, aqi, pm25, pm10, no2, o3, co, so2, lat, lon,
+    health_category, temp, humidity, wind_speed, uv_index, precip_prob,
+    forecast_aqi_24h, recorded_at, time, 1
+FROM station_aqi_history
+WHERE diff = 1
+  AND station_id IS NOT NULL
+ORDER BY station_id, time DESC
+ON CONFLICT (station_id) DO NOTHING;
@@ -0,0 +1,13 @@
+-- 002_recorded_ts.sql — Typed reading timestamp for station_aqi_history.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Adding a nullable column without a default is a catalog-only change, so
+-- this doesn't rewrite or lock the table for long. Existing rows are filled
+-- in afterwards, in batches, by backfill_recorded_ts.py, which also builds
+-- the new index and drops the old TEXT ones.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/002_recorded_ts.sql
+--   docker compose exec api python data/backfill_recorded_ts.py
+
+ALTER TABLE station_aqi_history ADD COLUMN IF NOT EXISTS recorded_ts TIMESTAMPTZ;
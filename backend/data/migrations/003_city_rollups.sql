@@ -0,0 +1,107 @@
+-- 003_city_rollups.sql — Hourly and daily city rollup tables, kept current
+-- by an insert trigger on station_aqi_history.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Existing history is rolled up afterwards by backfill_rollups.py.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/003_city_rollups.sql
+--   docker compose exec api python data/backfill_rollups.py
+
+-- Hourly / daily city rollups of live history rows (diff = 1), in UTC.
+-- Maintained by trg_sah_rollup on every insert; the history endpoints read
+-- these instead of aggregating raw rows. Averages are *_sum / sample_count.
+CREATE TABLE IF NOT EXISTS city_aqi_hourly (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    bucket TIMESTAMPTZ NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    pm25_sum FLOAT8 NOT NULL DEFAULT 0,
+    pm10_sum FLOAT8 NOT NULL DEFAULT 0,
+    no2_sum FLOAT8 NOT NULL DEFAULT 0,
+    o3_sum FLOAT8 NOT NULL DEFAULT 0,
+    co_sum FLOAT8 NOT NULL DEFAULT 0,
+    so2_sum FLOAT8 NOT NULL DEFAULT 0,
+    PRIMARY KEY (city_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS city_aqi_daily (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    pm25_sum FLOAT8 NOT NULL DEFAULT 0,
+    pm10_sum FLOAT8 NOT NULL DEFAULT 0,
+    no2_sum FLOAT8 NOT NULL DEFAULT 0,
+    o3_sum FLOAT8 NOT NULL DEFAULT 0,
+    co_sum FLOAT8 NOT NULL DEFAULT 0,
+    so2_sum FLOAT8 NOT NULL DEFAULT 0,
+    first_recorded_at TIMESTAMPTZ,
+    last_recorded_at TIMESTAMPTZ,
+    PRIMARY KEY (city_id, day)
+);
+
+-- Statement-level, so a batch insert costs one upsert per touched bucket
+CREATE OR REPLACE FUNCTION rollup_city_aqi() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO city_aqi_hourly AS r
+        (city_id, bucket, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum)
+    SELECT city_id, date_trunc('hour', recorded_ts, 'UTC'), COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0)
+    FROM new_rows
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, bucket) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum;
+
+    INSERT INTO city_aqi_daily AS r
+        (city_id, day, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum,
+         first_recorded_at, last_recorded_at)
+    SELECT city_id, (recorded_ts AT TIME ZONE 'UTC')::date, COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0),
+           MIN(recorded_ts), MAX(recorded_ts)
+    FROM new_rows
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, day) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum,
+        first_recorded_at = LEAST(r.first_recorded_at, EXCLUDED.first_recorded_at),
+        last_recorded_at  = GREATEST(r.last_recorded_at, EXCLUDED.last_recorded_at);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sah_rollup ON station_aqi_history;
+CREATE TRIGGER trg_sah_rollup
+    AFTER INSERT ON station_aqi_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_city_aqi();
@@ -0,0 +1,46 @@
+-- 004_history_partitions.sql — Partition maintenance functions for the
+-- monthly-partitioned station_aqi_history.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Existing databases then convert the table with partition_history.py
+-- (copy in batches, short locked swap), after 002 and 003 are applied.
+-- The `maintenance` service then runs maintain_partitions.py daily.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/004_history_partitions.sql
+--   docker compose exec api python data/partition_history.py
+
+-- Monthly partitions (UTC months), named station_aqi_history_yYYYYmMM.
+-- Creates any missing partition for the months p_from .. p_to (inclusive).
+CREATE OR REPLACE FUNCTION ensure_history_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+DECLARE
+    m DATE := date_trunc('month', p_from)::date;
+    created INTEGER := 0;
+    part TEXT;
+BEGIN
+    WHILE m <= p_to LOOP
+        part := format('station_aqi_history_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF station_aqi_history FOR VALUES FROM (%L) TO (%L)',
+                part, m::timestamp AT TIME ZONE 'UTC', (m + INTERVAL '1 month') AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Monthly partitions that end on or before p_before, oldest first.
+CREATE OR REPLACE FUNCTION history_partitions_before(p_before DATE)
+RETURNS TABLE (partition_name TEXT, month DATE) AS $$
+    SELECT c.relname::text, to_date(right(c.relname, 8), '"y"YYYY"m"MM')
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'station_aqi_history'::regclass
+      AND c.relname ~ '^station_aqi_history_y[0-9]{4}m[0-9]{2}$'
+      AND to_date(right(c.relname, 8), '"y"YYYY"m"MM') + INTERVAL '1 month' <= p_before
+    ORDER BY 2;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,62 @@
+-- 005_station_hourly.sql — Hourly per-station tier for compacted history and
+-- the station_aqi_tiered view over both tiers.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Apply after 004 and partition_history.py: the view is bound to the
+-- partitioned station_aqi_history. compact_history.py (also run by the
+-- `maintenance` service) then fills station_aqi_hourly.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/005_station_hourly.sql
+--   docker compose exec api python data/compact_history.py
+
+-- Station history is read newest-first by recorded_ts (live rows only)
+CREATE INDEX IF NOT EXISTS idx_sah_station_ts ON station_aqi_history(station_id, recorded_ts DESC) WHERE diff = 1;
+DROP INDEX IF EXISTS idx_sah_station_time;
+
+-- Hourly per-station aggregates of raw readings older than
+-- HISTORY_COMPACT_AFTER_DAYS, written by compact_history.py. The raw rows of
+-- a compacted month are truncated; station_aqi_tiered reads both tiers.
+CREATE TABLE IF NOT EXISTS station_aqi_hourly (
+    station_id INTEGER NOT NULL REFERENCES city_stations(id) ON DELETE CASCADE,
+    city_id INTEGER REFERENCES city_registry(id),
+    bucket TIMESTAMPTZ NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_avg FLOAT8,  aqi_min FLOAT8,  aqi_max FLOAT8,
+    pm25_avg FLOAT8, pm25_min FLOAT8, pm25_max FLOAT8,
+    pm10_avg FLOAT8, pm10_min FLOAT8, pm10_max FLOAT8,
+    no2_avg FLOAT8,  no2_min FLOAT8,  no2_max FLOAT8,
+    o3_avg FLOAT8,   o3_min FLOAT8,   o3_max FLOAT8,
+    co_avg FLOAT8,   co_min FLOAT8,   co_max FLOAT8,
+    so2_avg FLOAT8,  so2_min FLOAT8,  so2_max FLOAT8,
+    PRIMARY KEY (station_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_sah_hourly_city ON station_aqi_hourly(city_id, bucket);
+
+-- Raw live rows and compacted hours in one shape; a raw row is an "hour" of
+-- one sample. The two tiers never overlap in time for a station.
+CREATE OR REPLACE VIEW station_aqi_tiered AS
+    SELECT station_id, city_id, recorded_ts, recorded_at, time, 1 AS sample_count,
+           aqi  AS aqi_avg,  aqi  AS aqi_min,  aqi  AS aqi_max,
+           pm25 AS pm25_avg, pm25 AS pm25_min, pm25 AS pm25_max,
+           pm10 AS pm10_avg, pm10 AS pm10_min, pm10 AS pm10_max,
+           no2  AS no2_avg,  no2  AS no2_min,  no2  AS no2_max,
+           o3   AS o3_avg,   o3   AS o3_min,   o3   AS o3_max,
+           co   AS co_avg,   co   AS co_min,   co   AS co_max,
+           so2  AS so2_avg,  so2  AS so2_min,  so2  AS so2_max,
+           health_category
+    FROM station_aqi_history
+    WHERE diff = 1
+    UNION ALL
+    SELECT station_id, city_id, bucket,
+           to_char(bucket AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"+00:00"'),
+           (EXTRACT(EPOCH FROM bucket) * 1000)::bigint, sample_count,
+           aqi_avg,  aqi_min,  aqi_max,
+           pm25_avg, pm25_min, pm25_max,
+           pm10_avg, pm10_min, pm10_max,
+           no2_avg,  no2_min,  no2_max,
+           o3_avg,   o3_min,   o3_max,
+           co_avg,   co_min,   co_max,
+           so2_avg,  so2_min,  so2_max,
+           NULL
+    FROM station_aqi_hourly;
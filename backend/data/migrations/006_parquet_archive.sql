@@ -0,0 +1,18 @@
+-- 006_parquet_archive.sql — Run log for the Parquet cold tier.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Set HISTORY_ARCHIVE_AFTER_MONTHS (13 or more) to have the `maintenance`
+-- service move closed months to HISTORY_ARCHIVE_DIR.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/006_parquet_archive.sql
+--   docker compose exec maintenance python data/archive_history.py
+
+-- Months moved to the Parquet archive by archive_history.py, one row per run.
+-- A run's files are published only once its row is committed.
+CREATE TABLE IF NOT EXISTS history_parquet_runs (
+    run_id TEXT PRIMARY KEY,
+    month DATE NOT NULL,
+    row_count BIGINT NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,112 @@
+-- 007_day_of_year_stats.sql — Per calendar day YoY table, maintained by the
+-- rollup trigger.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Existing rows are filled from city_aqi_daily below; months already moved to
+-- the Parquet archive have no daily rollups left and are not included.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/007_day_of_year_stats.sql
+
+-- Per city and calendar day (UTC), one row per year: what the YoY card and
+-- /history/.../yoy-day read with a single index range scan. Maintained by
+-- trg_sah_rollup alongside the rollups, and kept when months are archived.
+CREATE TABLE IF NOT EXISTS city_day_of_year_stats (
+    city_id INTEGER NOT NULL REFERENCES city_registry(id) ON DELETE CASCADE,
+    month SMALLINT NOT NULL,
+    day SMALLINT NOT NULL,
+    year SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    aqi_sum FLOAT8 NOT NULL,
+    aqi_min FLOAT8,
+    aqi_max FLOAT8,
+    avg_aqi FLOAT8 GENERATED ALWAYS AS (aqi_sum / sample_count) STORED,
+    PRIMARY KEY (city_id, month, day, year)
+);
+
+-- Statement-level, so a batch insert costs one upsert per touched bucket
+CREATE OR REPLACE FUNCTION rollup_city_aqi() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO city_aqi_hourly AS r
+        (city_id, bucket, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum)
+    SELECT city_id, date_trunc('hour', recorded_ts, 'UTC'), COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0)
+    FROM new_rows
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, bucket) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum;
+
+    INSERT INTO city_aqi_daily AS r
+        (city_id, day, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum,
+         first_recorded_at, last_recorded_at)
+    SELECT city_id, (recorded_ts AT TIME ZONE 'UTC')::date, COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0),
+           MIN(recorded_ts), MAX(recorded_ts)
+    FROM new_rows
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, day) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum,
+        first_recorded_at = LEAST(r.first_recorded_at, EXCLUDED.first_recorded_at),
+        last_recorded_at  = GREATEST(r.last_recorded_at, EXCLUDED.last_recorded_at);
+
+    INSERT INTO city_day_of_year_stats AS r
+        (city_id, month, day, year, sample_count, aqi_sum, aqi_min, aqi_max)
+    SELECT city_id,
+           EXTRACT(MONTH FROM recorded_ts AT TIME ZONE 'UTC'),
+           EXTRACT(DAY   FROM recorded_ts AT TIME ZONE 'UTC'),
+           EXTRACT(YEAR  FROM recorded_ts AT TIME ZONE 'UTC'),
+           COUNT(*), SUM(aqi), MIN(aqi), MAX(aqi)
+    FROM new_rows
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (city_id, month, day, year) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum = r.aqi_sum + EXCLUDED.aqi_sum,
+        aqi_min = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max = GREATEST(r.aqi_max, EXCLUDED.aqi_max);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Writers wait in the trigger until the table is filled, so nothing is
+-- counted twice or missed
+BEGIN;
+LOCK TABLE city_aqi_daily IN SHARE ROW EXCLUSIVE MODE;
+INSERT INTO city_day_of_year_stats AS r
+    (city_id, month, day, year, sample_count, aqi_sum, aqi_min, aqi_max)
+SELECT city_id, EXTRACT(MONTH FROM day), EXTRACT(DAY FROM day), EXTRACT(YEAR FROM day),
+       sample_count, aqi_sum, aqi_min, aqi_max
+FROM city_aqi_daily
+ON CONFLICT (city_id, month, day, year) DO UPDATE SET
+    sample_count = EXCLUDED.sample_count,
+    aqi_sum = EXCLUDED.aqi_sum,
+    aqi_min = EXCLUDED.aqi_min,
+    aqi_max = EXCLUDED.aqi_max;
+COMMIT;
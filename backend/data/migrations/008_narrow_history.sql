@@ -0,0 +1,43 @@
+-- 008_narrow_history.sql — Moves weather, forecast and coordinates out of
+-- station_aqi_history into city_weather_history (once per city per cycle).
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Stop the pipeline first and start it again after this: its history sink
+-- no longer writes the dropped columns. Dropping a column only changes the
+-- catalog; existing rows shrink as partitions are compacted, archived or
+-- dropped. Past weather isn't carried over.
+--
+-- Usage (from project root):
+--   docker compose stop pathway_aqi
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/008_narrow_history.sql
+--   docker compose up -d --build pathway_aqi
+
+-- City weather and AQI forecast, one row per city per pipeline cycle (not per
+-- station reading). recorded_ts is when the row was fetched; recorded_at is
+-- Open-Meteo's local observation time.
+CREATE TABLE IF NOT EXISTS city_weather_history (
+    id BIGSERIAL PRIMARY KEY,
+    city_id INTEGER REFERENCES city_registry(id),
+    temp FLOAT8 DEFAULT 0,
+    feels_like FLOAT8 DEFAULT 0,
+    humidity INTEGER DEFAULT 0,
+    wind_speed FLOAT8 DEFAULT 0,
+    uv_index FLOAT8 DEFAULT 0,
+    precip_prob INTEGER DEFAULT 0,
+    forecast_aqi_24h TEXT DEFAULT '[]',
+    recorded_at TEXT,
+    recorded_ts TIMESTAMPTZ NOT NULL,
+    time BIGINT NOT NULL,
+    diff SMALLINT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cwh_city_ts ON city_weather_history(city_id, recorded_ts DESC);
+
+ALTER TABLE station_aqi_history
+    DROP COLUMN IF EXISTS lat,
+    DROP COLUMN IF EXISTS lon,
+    DROP COLUMN IF EXISTS temp,
+    DROP COLUMN IF EXISTS humidity,
+    DROP COLUMN IF EXISTS wind_speed,
+    DROP COLUMN IF EXISTS uv_index,
+    DROP COLUMN IF EXISTS precip_prob,
+    DROP COLUMN IF EXISTS forecast_aqi_24h;
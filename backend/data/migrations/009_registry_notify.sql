@@ -0,0 +1,26 @@
+-- 009_registry_notify.sql — Notify the pipeline when the city/station registry
+-- changes, so its connectors can cache it instead of querying it every cycle.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/009_registry_notify.sql
+
+-- Tell the pipeline's registry cache (pathway_pipeline/city_loader.py) to
+-- reload when cities or stations change, instead of it re-reading both tables
+-- every polling cycle.
+CREATE OR REPLACE FUNCTION notify_registry_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('registry_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_city_registry_notify ON city_registry;
+CREATE TRIGGER trg_city_registry_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON city_registry
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_registry_change();
+
+DROP TRIGGER IF EXISTS trg_city_stations_notify ON city_stations;
+CREATE TRIGGER trg_city_stations_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON city_stations
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_registry_change();
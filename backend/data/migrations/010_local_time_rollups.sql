@@ -0,0 +1,87 @@
+-- 010_local_time_rollups.sql — Buckets the history rollups in each city's
+-- local time again (city_registry.timezone) instead of UTC, so day/night
+-- hours and daily, monthly and YoY day boundaries follow the stations' own
+-- wall clock, as the raw readings' recorded_at does.
+-- New installs get this from init.sql. Safe to re-run.
+--
+-- Afterwards rebuild the existing rollups with backfill_rollups.py. Hours
+-- compacted before this (station_aqi_hourly) stay UTC-hour aggregates and are
+-- counted in the local hour they start in. city_day_of_year_stats rows of
+-- months already in the Parquet archive keep their UTC days.
+--
+-- Usage (from project root):
+--   docker compose exec -T postgres psql -U aqi_user -d aqi_db < backend/data/migrations/010_local_time_rollups.sql
+--   docker compose exec api python data/backfill_rollups.py
+
+ALTER TABLE city_registry ADD COLUMN IF NOT EXISTS timezone TEXT NOT NULL DEFAULT 'Asia/Kolkata';
+
+-- Statement-level, so a batch insert costs one upsert per touched bucket
+CREATE OR REPLACE FUNCTION rollup_city_aqi() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO city_aqi_hourly AS r
+        (city_id, bucket, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum)
+    SELECT city_id, date_trunc('hour', recorded_ts, c.timezone), COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, bucket) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum;
+
+    INSERT INTO city_aqi_daily AS r
+        (city_id, day, sample_count, aqi_sum, aqi_min, aqi_max,
+         pm25_sum, pm10_sum, no2_sum, o3_sum, co_sum, so2_sum,
+         first_recorded_at, last_recorded_at)
+    SELECT city_id, (recorded_ts AT TIME ZONE c.timezone)::date, COUNT(*),
+           SUM(aqi), MIN(aqi), MAX(aqi),
+           COALESCE(SUM(pm25), 0), COALESCE(SUM(pm10), 0), COALESCE(SUM(no2), 0),
+           COALESCE(SUM(o3), 0), COALESCE(SUM(co), 0), COALESCE(SUM(so2), 0),
+           MIN(recorded_ts), MAX(recorded_ts)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (city_id, day) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum  = r.aqi_sum  + EXCLUDED.aqi_sum,
+        aqi_min  = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max  = GREATEST(r.aqi_max, EXCLUDED.aqi_max),
+        pm25_sum = r.pm25_sum + EXCLUDED.pm25_sum,
+        pm10_sum = r.pm10_sum + EXCLUDED.pm10_sum,
+        no2_sum  = r.no2_sum  + EXCLUDED.no2_sum,
+        o3_sum   = r.o3_sum   + EXCLUDED.o3_sum,
+        co_sum   = r.co_sum   + EXCLUDED.co_sum,
+        so2_sum  = r.so2_sum  + EXCLUDED.so2_sum,
+        first_recorded_at = LEAST(r.first_recorded_at, EXCLUDED.first_recorded_at),
+        last_recorded_at  = GREATEST(r.last_recorded_at, EXCLUDED.last_recorded_at);
+
+    INSERT INTO city_day_of_year_stats AS r
+        (city_id, month, day, year, sample_count, aqi_sum, aqi_min, aqi_max)
+    SELECT city_id,
+           EXTRACT(MONTH FROM recorded_ts AT TIME ZONE c.timezone),
+           EXTRACT(DAY   FROM recorded_ts AT TIME ZONE c.timezone),
+           EXTRACT(YEAR  FROM recorded_ts AT TIME ZONE c.timezone),
+           COUNT(*), SUM(aqi), MIN(aqi), MAX(aqi)
+    FROM new_rows JOIN city_registry c ON c.id = city_id
+    WHERE diff = 1 AND city_id IS NOT NULL AND recorded_ts IS NOT NULL AND aqi IS NOT NULL
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (city_id, month, day, year) DO UPDATE SET
+        sample_count = r.sample_count + EXCLUDED.sample_count,
+        aqi_sum = r.aqi_sum + EXCLUDED.aqi_sum,
+        aqi_min = LEAST(r.aqi_min, EXCLUDED.aqi_min),
+        aqi_max = GREATEST(r.aqi_max, EXCLUDED.aqi_max);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
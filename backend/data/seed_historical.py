@@ -14,8 +14,15 @@ Usage (from project root):
 import os
 import random
 import math
+import sys
 import psycopg2
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# Same AQI categories as the pipeline and the API
+sys.path.append(str(Path(__file__).parent.parent))
+from pathway_pipeline.aqi_summary import classify_aqi
 
 # ── Connection ────────────────────────────────────────────────────────────────
 
@@ -96,26 +103,20 @@ def hourly_mult(hour: int) -> float:
         return 1.0
 
 
-def classify_aqi(aqi: float) -> str:
-    if aqi <= 50:    return "Good"
-    elif aqi <= 100: return "Moderate"
-    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
-    elif aqi <= 200: return "Unhealthy"
-    elif aqi <= 300: return "Very Unhealthy"
-    else:            return "Hazardous"
-
-
 def generate_day_readings(city_name: str, station_id: int, city_id: int,
-                           date: datetime.date, readings_per_day: int = 4) -> list:
-    """Generate `readings_per_day` synthetic hourly rows for a given date."""
+                           date: datetime.date, tz: ZoneInfo, readings_per_day: int = 4) -> tuple:
+    """
+    Generate `readings_per_day` synthetic hourly station rows for a given
+    date, plus the matching city weather rows. Hours are local to `tz`.
+    """
     profile = CITY_PROFILES.get(city_name)
     if not profile:
-        return []
+        return [], []
 
     base, *_ = profile
     s_mult = seasonal_mult(profile, date.month)
 
-    rows = []
+    rows, weather = [], []
     hours = [0, 6, 12, 18] if readings_per_day == 4 else list(range(0, 24, 24 // readings_per_day))
 
     for hour in hours:
@@ -134,7 +135,7 @@ def generate_day_readings(city_name: str, station_id: int, city_id: int,
         base_temp = 15 + 15 * math.sin((date.month - 4) * math.pi / 6)
         temp = base_temp + random.uniform(-3.0, 3.0)
 
-        dt = datetime(date.year, date.month, date.day, hour, tzinfo=timezone.utc)
+        dt = datetime(date.year, date.month, date.day, hour, tzinfo=tz)
         recorded_at = dt.isoformat()
         unix_time   = int(dt.timestamp())
 
@@ -143,17 +144,25 @@ def generate_day_readings(city_name: str, station_id: int, city_id: int,
             round(aqi, 1), round(pm25, 2), round(pm10, 2),
             round(no2, 2), round(o3, 2), round(co, 3), round(so2, 2),
             classify_aqi(aqi),
+            recorded_at,
+            dt,              # recorded_ts
+            unix_time,
+            1,  # diff
+        ))
+        weather.append((
+            city_id,
             round(temp, 1),
             random.randint(30, 85),          # humidity
             round(random.uniform(2, 25), 1), # wind_speed
             round(random.uniform(0, 11), 1), # uv_index
             random.randint(0, 60),           # precip_prob
             recorded_at,
+            dt,              # recorded_ts
             unix_time,
             1,  # diff
         ))
 
-    return rows
+    return rows, weather
 
 
 def main():
@@ -164,7 +173,7 @@ def main():
 
     # Load cities + their first station per city
     cur.execute("""
-        SELECT cr.id, cr.display_name, cs.id AS station_id
+        SELECT cr.id, cr.display_name, cr.timezone, cs.id AS station_id
         FROM city_registry cr
         LEFT JOIN LATERAL (
             SELECT id FROM city_stations
@@ -179,34 +188,49 @@ def main():
     total    = 0
     BATCH    = 500
 
+    # station_aqi_history is partitioned by (UTC) month; make sure the range
+    # exists, from a day early since local midnight can be the day before in UTC
+    cur.execute("SELECT ensure_history_partitions(%s, %s)", (start - timedelta(days=1), today))
+    conn.commit()
+
     INSERT_SQL = """
         INSERT INTO station_aqi_history
             (city_id, station_id, aqi, pm25, pm10, no2, o3, co, so2,
-             health_category, temp, humidity, wind_speed, uv_index, precip_prob,
-             recorded_at, time, diff)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+             health_category, recorded_at, recorded_ts, time, diff)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
         ON CONFLICT DO NOTHING
     """
+    WEATHER_SQL = """
+        INSERT INTO city_weather_history
+            (city_id, temp, humidity, wind_speed, uv_index, precip_prob,
+             recorded_at, recorded_ts, time, diff)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    """
 
-    for city_id, city_name, station_id in cities:
+    for city_id, city_name, tz_name, station_id in cities:
         if station_id is None:
             print(f"  ⚠ {city_name}: no station, skipping.")
             continue
 
         print(f"  Seeding {city_name} (city_id={city_id}, station_id={station_id}) …", end=" ", flush=True)
-        batch = []
+        batch, weather_batch = [], []
         d = start
         while d <= today:
-            batch.extend(generate_day_readings(city_name, station_id, city_id, d, readings_per_day=4))
+            rows, weather = generate_day_readings(city_name, station_id, city_id, d, ZoneInfo(tz_name),
+                                                  readings_per_day=4)
+            batch.extend(rows)
+            weather_batch.extend(weather)
             if len(batch) >= BATCH:
                 cur.executemany(INSERT_SQL, batch)
+                cur.executemany(WEATHER_SQL, weather_batch)
                 conn.commit()
                 total += len(batch)
-                batch = []
+                batch, weather_batch = [], []
             d += timedelta(days=1)
 
         if batch:
             cur.executemany(INSERT_SQL, batch)
+            cur.executemany(WEATHER_SQL, weather_batch)
             conn.commit()
             total += len(batch)
         print("done")
@@ -1,6 +1,6 @@
 import os
 import sys
-import json
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Provide absolute path to backend to resolve relative imports
@@ -14,30 +14,84 @@ import redis
 from pathway_pipeline.connectors.waqi_station_connector import WAQIStationConnectorSubject
 from pathway_pipeline.connectors.openmeteo_connector import OpenMeteoConnectorSubject
 from pathway_pipeline.schemas import StationAQISchema, WeatherSchema
+from pathway_pipeline.aqi_summary import classify_aqi
+from pathway_pipeline.pg_append_sink import PostgresAppendObserver
+from pathway_pipeline.redis_sink import RedisPublisherObserver
 
 # Settings
 WAQI_TOKEN = os.environ.get("WAQI_API_KEY")
 INTERVAL = int(os.environ.get("AQI_POLL_INTERVAL_S", 180))
+# Per-station bounds; each station's interval follows its own update cadence
+POLL_MIN_S = int(os.environ.get("AQI_POLL_MIN_S", 60))
+POLL_MAX_S = int(os.environ.get("AQI_POLL_MAX_S", 3600))
+POLL_OFFLINE_S = int(os.environ.get("AQI_POLL_OFFLINE_S", 21600))
+WEATHER_INTERVAL = int(os.environ.get("WEATHER_POLL_INTERVAL_S", 900))
+# Upstream request rate per host (token bucket), see connectors/upstream.py
+WAQI_RATE_PER_S = float(os.environ.get("WAQI_RATE_PER_S", 5))
+OPENMETEO_RATE_PER_S = float(os.environ.get("OPENMETEO_RATE_PER_S", 5))
+# Approximate cap on the live stream; consumers further behind than this resync
+STREAM_MAXLEN = int(os.environ.get("AQI_STREAM_MAXLEN", 10000))
+
+redis_host = os.environ.get("REDIS_URL", "redis://localhost:6379").replace("redis://", "").split(":")[0]
+r = redis.Redis(host=redis_host, port=6379, db=0)
+
+def publish_connector_stats(stats: dict) -> None:
+    """Running WAQI poll counts (unchanged readings are suppressed) and upstream state, read by the API's /metrics."""
+    try:
+        r.hset("pipeline:stats", mapping={**stats, "updated_at": datetime.now(timezone.utc).isoformat()})
+    except Exception as e:
+        print(f"Failed to publish pipeline stats: {e}")
 
 # ── 1. Ingest via ConnectorSubjects ───────────────────────────────────────────────────────────
 station_table = pw.io.python.read(
-    WAQIStationConnectorSubject(token=WAQI_TOKEN, interval=INTERVAL), 
+    WAQIStationConnectorSubject(
+        token=WAQI_TOKEN, interval=INTERVAL, on_cycle=publish_connector_stats,
+        min_interval=POLL_MIN_S, max_interval=POLL_MAX_S, offline_interval=POLL_OFFLINE_S,
+        rate_per_s=WAQI_RATE_PER_S,
+    ),
     schema=StationAQISchema,
     autocommit_duration_ms=1000
 )
 
 weather_table = pw.io.python.read(
-    OpenMeteoConnectorSubject(interval=INTERVAL), 
+    OpenMeteoConnectorSubject(
+        interval=WEATHER_INTERVAL, offline_interval=POLL_OFFLINE_S, rate_per_s=OPENMETEO_RATE_PER_S,
+    ),
     schema=WeatherSchema,
     autocommit_duration_ms=1000
 )
 
-# ── 2. Join on city_id ────────────────────────────────────────────────────────
-# LEFT JOIN: keeps station rows even if weather details hasn't arrived
-combined = station_table.join(
+# ── 2. Enrich: classify AQI ───────────────────────────────────────────────────
+# Same categories as the API and the published city documents
+classify_aqi_udf = pw.udf(classify_aqi)
+
+@pw.udf
+def parse_recorded_ts(recorded_at: str) -> pw.DateTimeUtc:
+    """An ISO-8601 time (WAQI reading, weather fetch) as a UTC timestamp; naive strings are UTC."""
+    try:
+        ts = datetime.fromisoformat(recorded_at)
+    except (TypeError, ValueError):
+        ts = datetime.now(timezone.utc)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return pw.DateTimeUtc(ts)
+
+# Both inputs are upserted by key (station_id / city_id), so they hold one
+# row per station and per city; a new poll replaces the previous row
+readings = station_table.select(
+    *pw.this,
+    recorded_at=pw.this.timestamp,
+    health_category=classify_aqi_udf(pw.this.aqi),
+    recorded_ts=parse_recorded_ts(pw.this.timestamp),
+)
+
+# ── 3. Join on city_id ────────────────────────────────────────────────────────
+# LEFT JOIN: keeps station rows even if weather details hasn't arrived. At most
+# one weather row per city, so the result stays keyed by station.
+enriched = readings.join_left(
     weather_table,
     pw.left.city_id == pw.right.city_id,
-    how=pw.JoinMode.LEFT
+    id=pw.left.id,
 ).select(
     city_id=pw.left.city_id,
     station_id=pw.left.station_id,
@@ -51,7 +105,8 @@ combined = station_table.join(
     so2=pw.left.so2,
     lat=pw.left.lat,
     lon=pw.left.lon,
-    recorded_at=pw.left.timestamp,
+    recorded_at=pw.left.recorded_at,
+    health_category=pw.left.health_category,
     temp=pw.right.temp,
     feels_like=pw.right.feels_like,
     humidity=pw.right.humidity,
@@ -61,21 +116,6 @@ combined = station_table.join(
     forecast_aqi_24h=pw.right.forecast_aqi_24h,
 )
 
-# ── 3. Enrich: classify AQI ───────────────────────────────────────────────────
-@pw.udf
-def classify_aqi(aqi: float) -> str:
-    if aqi <= 50:    return "Good"
-    elif aqi <= 100: return "Moderate"
-    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
-    elif aqi <= 200: return "Unhealthy"
-    elif aqi <= 300: return "Very Unhealthy"
-    else:            return "Hazardous"
-
-enriched = combined.select(
-    *pw.this,
-    health_category=classify_aqi(pw.this.aqi)
-)
-
 # ── 4. Outputs & Deduplication ─────────────────────────────────────────────────
 PG_SETTINGS = {
     "host":     os.environ.get("PGHOST",     "postgres"),
@@ -85,11 +125,52 @@ PG_SETTINGS = {
     "password": os.environ.get("PGPASSWORD", "secret"),
 }
 
-# Write full enriched record to Postgres
-pw.io.postgres.write(
+# History rows carry only keys and pollutant values; weather and the forecast
+# are stored once per city per cycle and coordinates live in city_stations.
+# Written from the readings, so a weather update doesn't rewrite them, and
+# insert-only: a replaced reading isn't stored again as a diff = -1 row.
+history_rows = readings.select(
+    city_id=pw.this.city_id,
+    station_id=pw.this.station_id,
+    aqi=pw.this.aqi,
+    pm25=pw.this.pm25,
+    pm10=pw.this.pm10,
+    no2=pw.this.no2,
+    o3=pw.this.o3,
+    co=pw.this.co,
+    so2=pw.this.so2,
+    health_category=pw.this.health_category,
+    recorded_at=pw.this.recorded_at,
+    recorded_ts=pw.this.recorded_ts,
+)
+pw.io.python.write(
+    history_rows,
+    PostgresAppendObserver(PG_SETTINGS, "station_aqi_history", history_rows.column_names()),
+)
+
+weather_rows = weather_table.select(
+    city_id=pw.this.city_id,
+    temp=pw.this.temp,
+    feels_like=pw.this.feels_like,
+    humidity=pw.this.humidity,
+    wind_speed=pw.this.wind_speed,
+    uv_index=pw.this.uv_index,
+    precip_prob=pw.this.precip_prob,
+    forecast_aqi_24h=pw.this.forecast_aqi_24h,
+    recorded_at=pw.this.timestamp,
+    recorded_ts=parse_recorded_ts(pw.this.fetched_at),
+)
+pw.io.python.write(
+    weather_rows,
+    PostgresAppendObserver(PG_SETTINGS, "city_weather_history", weather_rows.column_names()),
+)
+
+# Latest reading per station, upserted by station_id (serves DB fallbacks);
+# `enriched` already holds exactly that
+pw.io.postgres.write_snapshot(
     enriched.select(
-        city_id=pw.this.city_id,
         station_id=pw.this.station_id,
+        city_id=pw.this.city_id,
         aqi=pw.this.aqi,
         pm25=pw.this.pm25,
         pm10=pw.this.pm10,
@@ -109,67 +190,13 @@ pw.io.postgres.write(
         recorded_at=pw.this.recorded_at,
     ),
     PG_SETTINGS,
-    "station_aqi_history"
+    "station_latest",
+    ["station_id"],
 )
 
-# Redis Sink
-redis_host = os.environ.get("REDIS_URL", "redis://localhost:6379").replace("redis://", "").split(":")[0]
-r = redis.Redis(host=redis_host, port=6379, db=0)
-
-class RedisPublisherObserver(pw.io.python.ConnectorObserver):
-    def on_change(self, key, row, time, is_addition):
-        if is_addition:
-            try:
-                city_id = int(row.get("city_id", 0) or 0)
-                record = {
-                    "city_id": city_id,
-                    "station_id": int(row.get("station_id", 0) or 0),
-                    "city": str(row.get("city", "")),
-                    "aqi": int(row.get("aqi", 0) or 0),
-                    "pm25": float(row.get("pm25") or 0.0),
-                    "pm10": float(row.get("pm10") or 0.0),
-                    "no2": float(row.get("no2") or 0.0),
-                    "o3": float(row.get("o3") or 0.0),
-                    "co": float(row.get("co") or 0.0),
-                    "so2": float(row.get("so2") or 0.0),
-                    "health_category": str(row.get("health_category", "")),
-                    "temp": float(row.get("temp") or 0.0),
-                    "feels_like": float(row.get("feels_like") or 0.0),
-                    "humidity": int(row.get("humidity", 0) or 0),
-                    "wind_speed": float(row.get("wind_speed") or 0.0),
-                    "uv_index": float(row.get("uv_index") or 0.0),
-                    "precip_prob": int(row.get("precip_prob", 0) or 0),
-                    "forecast_aqi_24h": row.get("forecast_aqi_24h") or "[]",
-                    "lat": float(row.get("lat") or 0.0),
-                    "lon": float(row.get("lon") or 0.0)
-                }
-                # Pub/sub for real-time broadcast
-                r.publish('aqi:live', json.dumps(record))
-                # Cache latest station reading keyed by station_id
-                r.setex(f'station:{record["station_id"]}:latest', 1800, json.dumps(record))
-                # Cache city-level weather by city_id (overwrite per cycle — last station wins but weather is per city)
-                weather = {
-                    "city_id": city_id,
-                    "temp": record["temp"],
-                    "feels_like": record["feels_like"],
-                    "humidity": record["humidity"],
-                    "wind_speed": record["wind_speed"],
-                    "uv_index": record["uv_index"],
-                    "precip_prob": record["precip_prob"],
-                    "forecast_aqi_24h": record["forecast_aqi_24h"],
-                }
-                r.setex(f'weather:{city_id}', 1800, json.dumps(weather))
-            except Exception as e:
-                print(f"Failed to publish to redis: {e}")
-            
-    def next_json(self, value): 
-        pass
-    def next_tabular(self, values): 
-        pass
-    def request_resume(self): 
-        pass
-
-# This will trigger on updates
+# Redis Sink: batched per commit, written off the engine thread. A weather
+# update re-emits the city's stations here; the sink publishes those as a
+# weather change only, not as new readings (see redis_sink.py)
 pw.io.python.write(
     enriched.select(
         city_id=pw.this.city_id,
@@ -192,8 +219,9 @@ pw.io.python.write(
         forecast_aqi_24h=pw.this.forecast_aqi_24h,
         lat=pw.this.lat,
         lon=pw.this.lon,
+        recorded_at=pw.this.recorded_at,
     ),
-    RedisPublisherObserver()
+    RedisPublisherObserver(r, "aqi:live:stream", STREAM_MAXLEN),
 )
 
 pw.run()
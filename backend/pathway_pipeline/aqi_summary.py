@@ -0,0 +1,36 @@
+"""
+pathway_pipeline/aqi_summary.py — AQI health categories and the city summary
+document. Used by the pipeline (health_category, the published /summary
+documents), the API's live-state and database fallbacks and the historical
+seed, so they all agree. Standard library only: the API imports it too.
+"""
+
+
+def classify_aqi(aqi: float) -> str:
+    if aqi <= 50:    return "Good"
+    elif aqi <= 100: return "Moderate"
+    elif aqi <= 150: return "Unhealthy for Sensitive Groups"
+    elif aqi <= 200: return "Unhealthy"
+    elif aqi <= 300: return "Very Unhealthy"
+    else:            return "Hazardous"
+
+
+def city_summary(city_id: int, readings: list) -> dict:
+    """The /summary body for a city from its stations' latest readings (at least one)."""
+    avg_aqi = sum(r["aqi"] for r in readings) / len(readings)
+    # Weather is per city; take it from the first station that has it
+    weather = next((r for r in readings if r.get("temp")), readings[0])
+    return {
+        "city_id": city_id,
+        "aqi": round(avg_aqi),
+        "station_count": len(readings),
+        "health_category": classify_aqi(avg_aqi),
+        "temp": weather.get("temp", 0),
+        "feels_like": weather.get("feels_like", 0),
+        "humidity": weather.get("humidity", 0),
+        "wind_speed": weather.get("wind_speed", 0),
+        "uv_index": weather.get("uv_index", 0),
+        "precip_prob": weather.get("precip_prob", 0),
+        "forecast_aqi_24h": weather.get("forecast_aqi_24h", "[]"),
+        "stations": readings,
+    }
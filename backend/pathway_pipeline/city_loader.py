@@ -1,5 +1,8 @@
 import psycopg2
 import os
+import select
+import threading
+import time
 from contextlib import closing
 
 def get_db_url():
@@ -32,3 +35,79 @@ def load_stations():
                  "waqi_station_id": r[3], "lat": r[4], "lon": r[5]}
                 for r in rows
             ]
+
+
+class RegistryCache:
+    """
+    Cities and stations, loaded once and reloaded only after Postgres
+    signals a change: triggers on city_registry / city_stations NOTIFY
+    `registry_changed` (see init.sql), and a listener thread marks the cache
+    stale. While the listener is disconnected, notifications can be missed,
+    so it marks the cache stale again when it reconnects (the first connect
+    needs no reload: the cache starts stale).
+    """
+
+    CHANNEL = "registry_changed"
+
+    def __init__(self, retry_s: float = 30):
+        self.retry_s = retry_s
+        self._lock = threading.Lock()
+        self._stale = True
+        self._cities = []
+        self._stations = []
+        self._listener = None
+        self._listening = threading.Event()
+
+    def _listen(self):
+        reconnect = False
+        while True:
+            try:
+                with closing(psycopg2.connect(get_db_url())) as conn:
+                    conn.autocommit = True
+                    conn.cursor().execute(f"LISTEN {self.CHANNEL}")
+                    if reconnect:
+                        # Changes made while disconnected sent no notification to us
+                        self._stale = True
+                    reconnect = True
+                    self._listening.set()
+                    while True:
+                        if select.select([conn], [], [], 60) == ([], [], []):
+                            continue
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self._stale = True
+            except Exception as e:
+                print(f"[Registry] Listener error, retrying in {self.retry_s:.0f}s: {e}")
+                self._stale = True
+                time.sleep(self.retry_s)
+
+    def _refresh(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="registry-listener", daemon=True)
+                self._listener.start()
+                # Load after LISTEN so no change can fall between the two
+                self._listening.wait(timeout=10)
+            if self._stale:
+                # Cleared first: a change during the load marks it stale again
+                self._stale = False
+                try:
+                    self._cities, self._stations = load_cities(), load_stations()
+                except Exception as e:
+                    self._stale = True
+                    if not self._stations:
+                        raise
+                    print(f"[Registry] Reload failed, keeping the cached registry: {e}")
+
+    def cities(self) -> list:
+        self._refresh()
+        return self._cities
+
+    def stations(self) -> list:
+        self._refresh()
+        return self._stations
+
+
+# Shared by the connectors and the summary builder in the pipeline process
+registry = RegistryCache()
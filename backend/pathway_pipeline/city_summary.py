@@ -0,0 +1,75 @@
+"""
+pathway_pipeline/city_summary.py — Per-city summary documents for the API.
+Keeps the latest reading of every station and renders the /summary and
+/stations response bodies whenever a city changes, so the API can serve
+them straight from Redis without parsing or re-encoding.
+"""
+
+import json
+from collections import defaultdict
+
+from pathway_pipeline.aqi_summary import city_summary
+from pathway_pipeline.city_loader import registry as station_registry
+
+
+def _dumps(doc) -> bytes:
+    return json.dumps(doc, separators=(",", ":")).encode()
+
+
+class CitySummaryBuilder:
+    """Latest reading per station, grouped by city, rendered on demand."""
+
+    def __init__(self):
+        self.registry = defaultdict(list)   # city_id -> [station registry rows]
+        self.known_ids = set()
+        self.latest = defaultdict(dict)     # city_id -> {station_id: record}
+        self.reload_registry()
+
+    def reload_registry(self):
+        registry = defaultdict(list)
+        for s in station_registry.stations():
+            registry[s["city_id"]].append(s)
+        for rows in registry.values():
+            rows.sort(key=lambda s: s["id"])
+        self.registry = registry
+        self.known_ids = {s["id"] for rows in registry.values() for s in rows}
+
+    def update(self, record: dict) -> int:
+        """Stores a published station record and returns its city_id."""
+        if record["station_id"] not in self.known_ids:
+            try:
+                self.reload_registry()
+            except Exception as e:
+                print(f"[CitySummary] Registry reload failed: {e}")
+            # Don't hit Postgres again for a station the registry doesn't list
+            self.known_ids.add(record["station_id"])
+        city_id = record["city_id"]
+        self.latest[city_id][record["station_id"]] = record
+        return city_id
+
+    def update_weather(self, city_id: int, weather: dict) -> list:
+        """New weather for a city whose station readings didn't change; returns its records."""
+        records = list(self.latest[city_id].values())
+        for record in records:
+            record.update(weather)
+        return records
+
+    def render(self, city_id: int) -> tuple[bytes, bytes]:
+        """Returns the (summary, stations) JSON bodies for a city."""
+        readings = sorted(self.latest[city_id].values(), key=lambda r: r["station_id"])
+
+        stations = []
+        for s in self.registry.get(city_id, []):
+            d = self.latest[city_id].get(s["id"])
+            stations.append({
+                "id": s["id"], "station_name": s["station_name"],
+                "lat": float(s["lat"]) if s["lat"] is not None else None,
+                "lon": float(s["lon"]) if s["lon"] is not None else None,
+                "aqi": d["aqi"] if d else None,
+                "pm25": d["pm25"] if d else None,
+                "pm10": d["pm10"] if d else None,
+                "health_category": d["health_category"] if d else None,
+            })
+
+        summary = city_summary(city_id, readings)
+        return _dumps(summary), _dumps(stations)
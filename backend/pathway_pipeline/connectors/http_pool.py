@@ -0,0 +1,27 @@
+"""
+pathway_pipeline/connectors/http_pool.py — The long-lived HTTP client each
+connector keeps for its lifetime, so TLS sessions and connections are reused
+across polling cycles. HTTP/2 (one multiplexed connection per host) when the
+`h2` package is installed, pooled HTTP/1.1 keep-alive otherwise.
+"""
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+def pooled_client(idle_s: float, max_connections: int = 20) -> httpx.AsyncClient:
+    """Client whose idle connections outlive `idle_s` (the gap between polls)."""
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=10,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=idle_s + 60,
+        ),
+    )
@@ -1,82 +1,121 @@
 import pathway as pw
-import httpx
+from pathway.internals.api import SessionType
 import asyncio
-import time
 import json
-from pathway_pipeline.city_loader import load_cities
-from datetime import datetime
+from pathway_pipeline.city_loader import registry
+from pathway_pipeline.connectors.http_pool import pooled_client
+from pathway_pipeline.connectors.scheduler import PollScheduler
+from pathway_pipeline.connectors.upstream import CircuitOpenError, UpstreamClient
+from datetime import datetime, timezone
 
 class OpenMeteoConnectorSubject(pw.io.python.ConnectorSubject):
-    def __init__(self, interval=900):
+    """
+    Polls each city every `interval` seconds (Open-Meteo's current weather
+    moves in 15-minute steps and the CAMS forecast hourly, so this runs
+    slower than the station connector), spread evenly over the interval.
+    Failing cities back off up to `offline_interval`. Requests go through
+    UpstreamClient at `rate_per_s` per host.
+    """
+
+    def __init__(self, interval=900, offline_interval=21600, rate_per_s=5,
+                 forecast_url="https://api.open-meteo.com",
+                 air_quality_url="https://air-quality-api.open-meteo.com"):
         super().__init__()
-        self.cities = load_cities()
+        self.cities = []
         self.interval = interval
+        self.rate_per_s = rate_per_s
+        self.forecast_url = forecast_url
+        self.air_quality_url = air_quality_url
+        self.upstream = None
+        self.scheduler = PollScheduler(interval, min_s=60, max_s=interval,
+                                       offline_s=offline_interval, adaptive=False)
+        self._tasks = set()
 
-    async def fetch_weather(self, client, semaphore, city):
-        async with semaphore:
-            try:
-                # Current weather
-                w_resp = await client.get(
-                    "https://api.open-meteo.com/v1/forecast",
-                    params={
-                        "latitude": city["lat"], "longitude": city["lon"],
-                        "current": "temperature_2m,relative_humidity_2m,"
-                                   "wind_speed_10m,precipitation_probability,"
-                                   "uv_index,apparent_temperature",
-                        "timezone": "auto",
-                    },
-                    timeout=10,
-                )
-                
-                # 3-day AQI forecast from CAMS model
-                aq_resp = await client.get(
-                    "https://air-quality-api.open-meteo.com/v1/air-quality",
-                    params={
-                        "latitude": city["lat"], "longitude": city["lon"],
-                        "hourly": "pm2_5,pm10,nitrogen_dioxide,ozone,european_aqi",
-                        "forecast_days": 3, "timezone": "auto",
-                    },
-                    timeout=10,
-                )
+    @property
+    def _session_type(self) -> SessionType:
+        # A row for a known key replaces the previous one instead of appending
+        return SessionType.UPSERT
+
+    async def fetch_weather(self, city):
+        try:
+            # Current weather
+            w_resp = await self.upstream.get(
+                f"{self.forecast_url}/v1/forecast",
+                params={
+                    "latitude": city["lat"], "longitude": city["lon"],
+                    "current": "temperature_2m,relative_humidity_2m,"
+                               "wind_speed_10m,precipitation_probability,"
+                               "uv_index,apparent_temperature",
+                    "timezone": "auto",
+                },
+                timeout=10,
+            )
+            
+            # 3-day AQI forecast from CAMS model
+            aq_resp = await self.upstream.get(
+                f"{self.air_quality_url}/v1/air-quality",
+                params={
+                    "latitude": city["lat"], "longitude": city["lon"],
+                    "hourly": "pm2_5,pm10,nitrogen_dioxide,ozone,european_aqi",
+                    "forecast_days": 3, "timezone": "auto",
+                },
+                timeout=10,
+            )
+            
+            if w_resp.status_code == 200 and aq_resp.status_code == 200:
+                w = w_resp.json()
+                aq = aq_resp.json()
+                current = w.get("current", {})
+                forecast_24h = aq.get("hourly", {}).get("european_aqi", [])[:24]
                 
-                if w_resp.status_code == 200 and aq_resp.status_code == 200:
-                    w = w_resp.json()
-                    aq = aq_resp.json()
-                    current = w.get("current", {})
-                    forecast_24h = aq.get("hourly", {}).get("european_aqi", [])[:24]
-                    
-                    return {
-                        "city_id": city["id"],
-                        "city": city["display_name"],
-                        "lat": float(city["lat"]),
-                        "lon": float(city["lon"]),
-                        "temp": float(current.get("temperature_2m", 0.0) or 0.0),
-                        "feels_like": float(current.get("apparent_temperature", 0.0) or 0.0),
-                        "humidity": int(current.get("relative_humidity_2m", 0) or 0),
-                        "wind_speed": float(current.get("wind_speed_10m", 0.0) or 0.0),
-                        "uv_index": float(current.get("uv_index", 0.0) or 0.0),
-                        "precip_prob": int(current.get("precipitation_probability", 0) or 0),
-                        "forecast_aqi_24h": json.dumps(forecast_24h),
-                        "timestamp": current.get("time", datetime.utcnow().isoformat())
-                    }
-            except Exception as e:
-                print(f"[OpenMeteo] Error fetching {city['display_name']}: {e}")
+                return {
+                    "city_id": city["id"],
+                    "city": city["display_name"],
+                    "lat": float(city["lat"]),
+                    "lon": float(city["lon"]),
+                    "temp": float(current.get("temperature_2m", 0.0) or 0.0),
+                    "feels_like": float(current.get("apparent_temperature", 0.0) or 0.0),
+                    "humidity": int(current.get("relative_humidity_2m", 0) or 0),
+                    "wind_speed": float(current.get("wind_speed_10m", 0.0) or 0.0),
+                    "uv_index": float(current.get("uv_index", 0.0) or 0.0),
+                    "precip_prob": int(current.get("precipitation_probability", 0) or 0),
+                    "forecast_aqi_24h": json.dumps(forecast_24h),
+                    "timestamp": current.get("time", datetime.utcnow().isoformat()),
+                    "fetched_at": datetime.now(timezone.utc).isoformat(),
+                }
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            print(f"[OpenMeteo] Error fetching {city['display_name']}: {e}")
         return None
 
-    async def poll_all(self):
-        semaphore = asyncio.Semaphore(10)
-        async with httpx.AsyncClient() as client:
-            tasks = [self.fetch_weather(client, semaphore, c) for c in self.cities]
-            results = await asyncio.gather(*tasks)
-            for res in results:
-                if res is not None:
-                    self.next_json(res)
+    async def poll_city(self, city):
+        res = await self.fetch_weather(city)
+        if res is None:
+            self.scheduler.failed(city["id"])
+            return
+        self.scheduler.reading(city["id"])
+        self.next_json(res)
+
+    async def poll_forever(self):
+        # One client (and connection pool) for the connector's lifetime
+        async with pooled_client(self.interval) as client:
+            self.upstream = UpstreamClient(client, rate_per_s=self.rate_per_s, name="OpenMeteo")
+            while True:
+                try:
+                    # Cached; reloaded only after city_registry changes. A reload is
+                    # blocking psycopg2, so it runs off the event loop.
+                    cities = await asyncio.to_thread(registry.cities)
+                    if cities is not self.cities:
+                        self.cities = cities
+                        self.scheduler.sync({c["id"]: c for c in cities})
+                    for city in self.scheduler.due():
+                        task = asyncio.create_task(self.poll_city(city))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                except Exception as e:
+                    print(f"[OpenMeteo] Scheduling error: {e}")
+                await asyncio.sleep(self.scheduler.wheel.tick_s)
 
     def run(self):
-        while True:
-            try:
-                self.cities = load_cities()
-                asyncio.run(self.poll_all())
-            except Exception as e:
-                print(f"[OpenMeteo] Polling cycle error: {e}")
-            time.sleep(self.interval)
+        asyncio.run(self.poll_forever())
@@ -0,0 +1,158 @@
+"""
+pathway_pipeline/connectors/scheduler.py — Per-station poll scheduling for
+the connectors, so upstream calls, history writes and live emits are spread
+over the polling interval instead of arriving as one burst.
+
+TimingWheel is a hashed timing wheel: `slots` buckets of `tick_s` seconds.
+A key due in d seconds goes into bucket (tick + d / tick_s) mod slots and is
+returned by advance() once that tick has passed; keys further out than one
+revolution wait in their bucket for the extra rounds. Scheduling and
+cancelling are O(1) and each tick looks at a single bucket.
+
+PollScheduler keeps one wheel entry per station (or city) and decides each
+next delay:
+  - a new reading (its upstream time moved on): the delta to the previous
+    upstream time is folded into the station's update cadence, and the
+    next poll is one cadence later, clamped to [min_s, max_s]
+  - the same reading again: the update is late; probe again after a
+    quarter of the cadence, doubling on every further repeat up to
+    offline_s (stations stuck on an old reading end up there)
+  - an error or no data: back off exponentially from min_s to offline_s
+With adaptive=False successful polls simply repeat every `interval`.
+Delays carry ±10% jitter so keys don't drift into the same tick.
+"""
+
+import math
+import random
+import time
+from datetime import datetime
+
+
+class TimingWheel:
+    def __init__(self, tick_s: float = 1.0, slots: int = 512, clock=time.monotonic):
+        self.tick_s = tick_s
+        self.clock = clock
+        self._slots = [{} for _ in range(slots)]   # key -> deadline tick
+        self._where = {}                           # key -> slot index
+        self._tick = self._now_tick()
+
+    def _now_tick(self) -> int:
+        return int(self.clock() // self.tick_s)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    def schedule(self, key, delay_s: float) -> None:
+        self.cancel(key)
+        deadline = max(self._tick, self._now_tick()) + max(1, math.ceil(delay_s / self.tick_s))
+        slot = deadline % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._where[key] = slot
+
+    def cancel(self, key) -> None:
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self) -> list:
+        """Keys whose deadline has passed since the last call, removed from the wheel."""
+        now = self._now_tick()
+        due = []
+        # After a stall longer than a revolution, one pass covers every bucket
+        for tick in range(max(self._tick + 1, now - len(self._slots) + 1), now + 1):
+            bucket = self._slots[tick % len(self._slots)]
+            for key in [k for k, deadline in bucket.items() if deadline <= now]:
+                del bucket[key]
+                del self._where[key]
+                due.append(key)
+        self._tick = max(self._tick, now)
+        return due
+
+
+def parse_observed(iso) -> datetime | None:
+    """Upstream observation time (e.g. WAQI time.iso); None unless tz-aware."""
+    try:
+        observed = datetime.fromisoformat(str(iso))
+    except (TypeError, ValueError):
+        return None
+    return observed if observed.tzinfo is not None else None
+
+
+class _Cadence:
+    __slots__ = ("interval", "measured", "observed_at", "repeats", "failures")
+
+    def __init__(self, interval: float):
+        self.interval = interval     # estimated seconds between upstream updates
+        self.measured = False        # False while `interval` is still the configured guess
+        self.observed_at = None      # upstream time of the last new reading
+        self.repeats = 0             # polls since then that returned the same reading
+        self.failures = 0            # consecutive failed polls
+
+
+class PollScheduler:
+    def __init__(self, interval: float, min_s: float = 60, max_s: float = 3600,
+                 offline_s: float = 21600, adaptive: bool = True, alpha: float = 0.3,
+                 wheel: TimingWheel | None = None):
+        self.interval = interval
+        self.min_s = min(min_s, interval)
+        self.max_s = max(max_s, interval)
+        self.offline_s = max(offline_s, self.max_s)
+        self.adaptive = adaptive
+        self.alpha = alpha
+        self.wheel = wheel if wheel is not None else TimingWheel()
+        self._items = {}             # key -> item handed back by due()
+        self._cadence = {}           # key -> _Cadence
+
+    def sync(self, items: dict) -> None:
+        """Track exactly `items` (key -> item). New keys are spread evenly over one interval."""
+        for key in self._items.keys() - items.keys():
+            self.wheel.cancel(key)
+            self._cadence.pop(key, None)
+        new = [k for k in items if k not in self._items]
+        for i, key in enumerate(new):
+            self._cadence[key] = _Cadence(self.interval)
+            self.wheel.schedule(key, i * self.interval / len(new))
+        self._items = dict(items)
+
+    def due(self) -> list:
+        return [self._items[k] for k in self.wheel.advance() if k in self._items]
+
+    def reading(self, key, observed_at: datetime | None = None) -> None:
+        """A poll of `key` returned data; `observed_at` is the upstream time, if known."""
+        c = self._cadence.get(key)
+        if c is None:
+            return
+        c.failures = 0
+        if not self.adaptive or observed_at is None:
+            delay = c.interval
+        elif c.observed_at is None or observed_at > c.observed_at:
+            if c.observed_at is not None:
+                delta = (observed_at - c.observed_at).total_seconds()
+                # The first measured delta replaces the configured guess outright
+                estimate = self.alpha * delta + (1 - self.alpha) * c.interval if c.measured else delta
+                c.interval = min(max(estimate, self.min_s), self.max_s)
+                c.measured = True
+            c.observed_at = observed_at
+            c.repeats = 0
+            delay = c.interval
+        else:
+            c.repeats += 1
+            delay = c.interval / 4 * 2 ** (c.repeats - 1)
+        self._schedule(key, min(max(delay, self.min_s), self.offline_s))
+
+    def failed(self, key) -> None:
+        c = self._cadence.get(key)
+        if c is None:
+            return
+        c.failures += 1
+        self._schedule(key, min(self.min_s * 2 ** c.failures, self.offline_s))
+
+    def _schedule(self, key, delay: float) -> None:
+        self.wheel.schedule(key, delay * random.uniform(0.9, 1.1))
+
+    def offline_count(self) -> int:
+        """Keys currently backing off after failures or repeated unchanged readings."""
+        return sum(1 for c in self._cadence.values() if c.failures or c.repeats >= 4)
@@ -0,0 +1,235 @@
+"""
+pathway_pipeline/connectors/upstream.py — Shared resilience layer for the
+connectors' upstream calls (WAQI, Open-Meteo). Every host gets its own
+
+  - TokenBucket           requests per second with a small burst, so a
+                          backlog of due polls can't burn the quota at once
+  - AdaptiveConcurrency   AIMD limit on in-flight requests: +1 per limit's
+                          worth of fast successes, halved (at most once per
+                          cooldown) on errors, 429/5xx or latency above
+                          `tolerance` × the host's baseline latency
+  - CircuitBreaker        opens after `failure_threshold` failed attempts in a
+                          row; while open, calls fail fast with
+                          CircuitOpenError; after `reset_s` one probe is let
+                          through and its outcome closes or reopens it
+
+UpstreamClient.get() runs a request through all three and retries transport
+errors, 429 and 5xx with full-jitter exponential backoff (429 honours
+Retry-After). Other responses, 4xx included, are returned to the caller.
+The clock and sleep are injectable and the connectors take their base URLs
+as arguments, so all of this runs against a local stub server.
+"""
+
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """A request failed after all retries without any response."""
+
+
+class CircuitOpenError(UpstreamError):
+    """The host's circuit breaker is open; the request was not sent."""
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, clock=time.monotonic, sleep=asyncio.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+
+    async def acquire(self) -> None:
+        while True:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await self.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 20,
+                 tolerance: float = 2.0, cooldown_s: float = 1.0, clock=time.monotonic):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.cooldown_s = cooldown_s
+        self.clock = clock
+        self.inflight = 0
+        self.baseline = None         # latency of a healthy request, seconds
+        self._last_decrease = float("-inf")
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, latency: float | None, ok: bool) -> None:
+        async with self._cond:
+            self.inflight -= 1
+            self._adjust(latency, ok)
+            self._cond.notify_all()
+
+    def _adjust(self, latency: float | None, ok: bool) -> None:
+        slow = False
+        if ok and latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # Follows real slowdowns, but slowly enough that a spike stands out
+                self.baseline += (latency - self.baseline) * 0.05
+                slow = latency > self.tolerance * self.baseline
+        if ok and not slow:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif self.clock() - self._last_decrease >= self.cooldown_s:
+            # One cut per cooldown: a burst of failures from one window counts once
+            self._last_decrease = self.clock()
+            self.limit = max(self.min_limit, self.limit / 2)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_s: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_s:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == self.CLOSED
+
+    def success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def abandon_probe(self) -> None:
+        """The half-open probe ended without an outcome (cancelled, crashed); let another request probe."""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def failure(self) -> bool:
+        """Records a failed attempt; True if this opened the circuit."""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self.state = self.OPEN
+            self._opened_at = self.clock()
+            self._probing = False
+            return True
+        return False
+
+
+class _Host:
+    def __init__(self, name: str, client: "UpstreamClient"):
+        self.name = name
+        self.bucket = TokenBucket(client.rate_per_s, client.burst, client.clock, client.sleep)
+        self.concurrency = AdaptiveConcurrency(max_limit=client.max_concurrency, clock=client.clock)
+        self.breaker = CircuitBreaker(client.failure_threshold, client.reset_s, client.clock)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+
+class UpstreamClient:
+    def __init__(self, client: httpx.AsyncClient, rate_per_s: float = 5, burst: float = 10,
+                 max_concurrency: int = 20, retries: int = 2, backoff_s: float = 0.5,
+                 max_backoff_s: float = 30, failure_threshold: int = 5, reset_s: float = 30,
+                 clock=time.monotonic, sleep=asyncio.sleep, name: str = "Upstream"):
+        self.client = client
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.clock = clock
+        self.sleep = sleep
+        self.name = name
+        self._hosts = {}
+
+    def _host(self, url: str) -> _Host:
+        netloc = urlsplit(url).netloc
+        if netloc not in self._hosts:
+            self._hosts[netloc] = _Host(netloc, self)
+        return self._hosts[netloc]
+
+    def _backoff(self, attempt: int, resp) -> float:
+        if resp is not None and resp.status_code == 429:
+            try:
+                return min(float(resp.headers.get("retry-after", "")), self.max_backoff_s)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        host = self._host(url)
+        resp = error = None
+        for attempt in range(self.retries + 1):
+            if not host.breaker.allow():
+                host.stats["rejected"] += 1
+                raise CircuitOpenError(f"{host.name}: circuit open")
+            probing = host.breaker.state == CircuitBreaker.HALF_OPEN
+            try:
+                await host.bucket.acquire()
+                await host.concurrency.acquire()
+                start = self.clock()
+                resp = error = None
+                try:
+                    resp = await self.client.get(url, **kwargs)
+                except httpx.HTTPError as e:
+                    error = e
+                finally:
+                    ok = resp is not None and resp.status_code not in RETRY_STATUSES
+                    await host.concurrency.release(self.clock() - start if ok else None, ok)
+                host.stats["requests"] += 1
+                if ok:
+                    host.breaker.success()
+                    return resp
+                host.stats["failures"] += 1
+                if host.breaker.failure():
+                    print(f"[{self.name}] {host.name} failing, circuit open for {host.breaker.reset_s:.0f}s")
+            finally:
+                if probing:
+                    # No-op once success()/failure() ran; otherwise the probe slot would stay taken
+                    host.breaker.abandon_probe()
+            if attempt == self.retries:
+                break
+            host.stats["retries"] += 1
+            await self.sleep(self._backoff(attempt, resp))
+        if resp is not None:
+            return resp
+        raise UpstreamError(f"{host.name}: {error!r}") from error
+
+    def stats(self) -> dict:
+        """Flat per-host counters and state, e.g. for the pipeline:stats hash."""
+        out = {}
+        for host in self._hosts.values():
+            out.update({f"{host.name}:{k}": v for k, v in host.stats.items()})
+            out[f"{host.name}:concurrency"] = int(host.concurrency.limit)
+            out[f"{host.name}:circuit"] = host.breaker.state
+        return out
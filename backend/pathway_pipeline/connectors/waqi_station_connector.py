@@ -1,62 +1,126 @@
 import pathway as pw
-import httpx
+from pathway.internals.api import SessionType
 import asyncio
-import time
 from datetime import datetime
-from pathway_pipeline.city_loader import load_stations
+from pathway_pipeline.city_loader import registry
+from pathway_pipeline.connectors.http_pool import pooled_client
+from pathway_pipeline.connectors.scheduler import PollScheduler, parse_observed
+from pathway_pipeline.connectors.upstream import CircuitOpenError, UpstreamClient
+
+# Fields that make two readings of a station the same reading
+FINGERPRINT_FIELDS = ("timestamp", "aqi", "pm25", "pm10", "no2", "o3", "co", "so2")
+
 
 class WAQIStationConnectorSubject(pw.io.python.ConnectorSubject):
-    def __init__(self, token, interval=900):
+    """
+    Polls each station on its own schedule (see connectors/scheduler.py):
+    stations start spread evenly over `interval` seconds, then each one's
+    interval follows the update cadence its time.iso shows, between
+    `min_interval` and `max_interval`, and stations that fail or stop
+    updating back off up to `offline_interval`. A reading whose upstream
+    time and values match the last one emitted for that station is dropped
+    here, before any sink sees it. Requests go through UpstreamClient
+    (rate limit, adaptive concurrency, retries, circuit breaker) at
+    `rate_per_s`. `on_cycle(stats)` is called every `interval` seconds with
+    running counts.
+    """
+
+    def __init__(self, token, interval=900, on_cycle=None,
+                 min_interval=60, max_interval=3600, offline_interval=21600,
+                 rate_per_s=5, base_url="https://api.waqi.info"):
         super().__init__()
-        self.stations = load_stations()
+        self.stations = []
         self.token = token
         self.interval = interval
+        self.on_cycle = on_cycle
+        self.rate_per_s = rate_per_s
+        self.base_url = base_url
+        self.upstream = None
+        self.scheduler = PollScheduler(interval, min_interval, max_interval, offline_interval)
+        self._last_seen = {}        # station_id -> fingerprint of the last emitted reading
+        self._tasks = set()
+        self.stats = {"polled": 0, "emitted": 0, "suppressed": 0, "stations": 0, "offline": 0}
 
-    async def fetch_station(self, client, semaphore, station):
-        url = f"https://api.waqi.info/feed/{station['waqi_station_id']}/?token={self.token}"
-        async with semaphore:
-            try:
-                resp = await client.get(url, timeout=10)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if data.get("status") == "ok":
-                        d = data["data"]
-                        iaqi = d.get("iaqi", {})
-                        
-                        return {
-                            "city_id": station["city_id"],
-                            "station_id": station["id"],
-                            "city": station["station_name"],
-                            "aqi": float(d.get("aqi", 0) if str(d.get("aqi", 0)).isdigit() else 0),
-                            "pm25": float(iaqi.get("pm25", {}).get("v", 0.0)),
-                            "pm10": float(iaqi.get("pm10", {}).get("v", 0.0)),
-                            "no2": float(iaqi.get("no2", {}).get("v", 0.0)),
-                            "o3": float(iaqi.get("o3", {}).get("v", 0.0)),
-                            "co": float(iaqi.get("co", {}).get("v", 0.0)),
-                            "so2": float(iaqi.get("so2", {}).get("v", 0.0)),
-                            "lat": float(station["lat"]) if station["lat"] else 0.0,
-                            "lon": float(station["lon"]) if station["lon"] else 0.0,
-                            "timestamp": d.get("time", {}).get("iso", datetime.utcnow().isoformat()),
-                        }
-            except Exception as e:
-                print(f"[WAQIStation] Error fetching {station['waqi_station_id']}: {e}")
+    @property
+    def _session_type(self) -> SessionType:
+        # A row for a known key replaces the previous one instead of appending
+        return SessionType.UPSERT
+
+    async def fetch_station(self, station):
+        url = f"{self.base_url}/feed/{station['waqi_station_id']}/?token={self.token}"
+        try:
+            resp = await self.upstream.get(url)
+            if resp.status_code == 200:
+                data = resp.json()
+                if data.get("status") == "ok":
+                    d = data["data"]
+                    iaqi = d.get("iaqi", {})
+                    
+                    return {
+                        "city_id": station["city_id"],
+                        "station_id": station["id"],
+                        "city": station["station_name"],
+                        "aqi": float(d.get("aqi", 0) if str(d.get("aqi", 0)).isdigit() else 0),
+                        "pm25": float(iaqi.get("pm25", {}).get("v", 0.0)),
+                        "pm10": float(iaqi.get("pm10", {}).get("v", 0.0)),
+                        "no2": float(iaqi.get("no2", {}).get("v", 0.0)),
+                        "o3": float(iaqi.get("o3", {}).get("v", 0.0)),
+                        "co": float(iaqi.get("co", {}).get("v", 0.0)),
+                        "so2": float(iaqi.get("so2", {}).get("v", 0.0)),
+                        "lat": float(station["lat"]) if station["lat"] else 0.0,
+                        "lon": float(station["lon"]) if station["lon"] else 0.0,
+                        "timestamp": d.get("time", {}).get("iso", datetime.utcnow().isoformat()),
+                    }
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            print(f"[WAQIStation] Error fetching {station['waqi_station_id']}: {e}")
         return None
 
-    async def poll_all(self):
-        semaphore = asyncio.Semaphore(10)
-        async with httpx.AsyncClient() as client:
-            tasks = [self.fetch_station(client, semaphore, s) for s in self.stations]
-            results = await asyncio.gather(*tasks)
-            for res in results:
-                if res is not None:
-                    self.next_json(res)
+    async def poll_station(self, station):
+        res = await self.fetch_station(station)
+        if res is None:
+            self.scheduler.failed(station["id"])
+            return
+        self.scheduler.reading(station["id"], parse_observed(res["timestamp"]))
+        self.stats["polled"] += 1
+        fingerprint = tuple(res[f] for f in FINGERPRINT_FIELDS)
+        if self._last_seen.get(res["station_id"]) == fingerprint:
+            self.stats["suppressed"] += 1
+            return
+        self._last_seen[res["station_id"]] = fingerprint
+        self.stats["emitted"] += 1
+        self.next_json(res)
+
+    def report(self):
+        self.stats["stations"] = len(self.stations)
+        self.stats["offline"] = self.scheduler.offline_count()
+        self.on_cycle({**self.stats, **self.upstream.stats()})
+
+    async def poll_forever(self):
+        tick_s = self.scheduler.wheel.tick_s
+        next_report = self.scheduler.wheel.clock() + self.interval
+        # One client (and connection pool) for the connector's lifetime
+        async with pooled_client(self.interval) as client:
+            self.upstream = UpstreamClient(client, rate_per_s=self.rate_per_s, name="WAQIStation")
+            while True:
+                try:
+                    # Cached; reloaded only after city_stations changes. A reload is
+                    # blocking psycopg2, so it runs off the event loop.
+                    stations = await asyncio.to_thread(registry.stations)
+                    if stations is not self.stations:
+                        self.stations = stations
+                        self.scheduler.sync({s["id"]: s for s in stations})
+                    for station in self.scheduler.due():
+                        task = asyncio.create_task(self.poll_station(station))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                    if self.on_cycle and self.scheduler.wheel.clock() >= next_report:
+                        next_report += self.interval
+                        self.report()
+                except Exception as e:
+                    print(f"[WAQIStation] Scheduling error: {e}")
+                await asyncio.sleep(tick_s)
 
     def run(self):
-        while True:
-            try:
-                # Reload stations just in case new ones were added
-                self.stations = load_stations()
-                asyncio.run(self.poll_all())
-            except Exception as e:
-                print(f"[WAQIStation] Polling cycle error: {e}")
-            time.sleep(self.interval)
+        asyncio.run(self.poll_forever())
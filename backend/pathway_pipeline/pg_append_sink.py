@@ -0,0 +1,57 @@
+"""
+pathway_pipeline/pg_append_sink.py — Insert-only Postgres sink for history
+tables.
+
+pw.io.postgres.write stores every change, so each replaced reading also lands
+as a diff = -1 row. History only needs the additions: this observer buffers
+them for the current Pathway commit and writes them with one multi-row
+INSERT in on_time_end (one statement, so the rollup trigger runs once per
+commit). Rows carry `time` (the commit time) and diff = 1 like the rows the
+built-in sink wrote.
+
+If Postgres is unavailable the rows stay buffered, up to `max_buffered`
+(oldest dropped beyond that), and go out with the next commit.
+"""
+
+import psycopg2
+from psycopg2.extras import execute_values
+import pathway as pw
+
+
+class PostgresAppendObserver(pw.io.python.ConnectorObserver):
+    def __init__(self, pg_settings: dict, table: str, columns: list, max_buffered: int = 100_000):
+        self.pg_settings = pg_settings
+        self.table = table
+        self.columns = list(columns)
+        self.max_buffered = max_buffered
+        self._sql = f'INSERT INTO {table} ({", ".join(self.columns)}, time, diff) VALUES %s'
+        self._conn = None
+        self._pending = []
+
+    def on_change(self, key, row, time, is_addition):
+        if is_addition:
+            self._pending.append(tuple(row.get(c) for c in self.columns) + (time, 1))
+
+    def on_time_end(self, time):
+        if not self._pending:
+            return
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = psycopg2.connect(**self.pg_settings)
+            with self._conn.cursor() as cur:
+                execute_values(cur, self._sql, self._pending, page_size=1000)
+            self._conn.commit()
+            self._pending = []
+        except Exception as e:
+            print(f"[{self.table}] Insert failed, {len(self._pending)} row(s) kept for the next commit: {e}")
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+            del self._pending[:-self.max_buffered]
+
+    def on_end(self):
+        self.on_time_end(None)
+        if self._conn is not None:
+            self._conn.close()
@@ -0,0 +1,149 @@
+"""
+pathway_pipeline/redis_sink.py — Publishes station readings to Redis.
+
+The observer only collects rows on Pathway's output thread: on_change keeps
+the latest record per station, and on_time_end hands the commit's batch to a
+background writer through a bounded queue (the engine waits when the writer
+is `max_queued` batches behind). The writer publishes each batch as one
+INCRBY for the sequence numbers plus one non-transactional pipeline with
+    - the live stream entries   (aqi:live:stream, capped)
+    - station:{id}:latest       per station (weather: every station of the city)
+    - weather:{city_id}         once per city
+    - city:{id}:docs            re-rendered once per city
+so a full polling cycle costs a couple of round trips.
+
+The sink reads `enriched`, where every station row carries its city's
+weather, so a weather poll re-emits all of that city's stations. A row whose
+station fields are unchanged since it was last published is therefore not a
+new reading. Its new weather is published once for the city instead: one
+stream entry {"type": "weather", "city_id", <weather fields>, "seq"} with
+its own sequence number, weather:{city_id}, and the weather fields of the
+city's station:{id}:latest keys (rewritten without extending their TTL).
+"""
+
+import itertools
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+import pathway as pw
+from pathway_pipeline.city_summary import CitySummaryBuilder
+
+TTL_S = 1800
+WEATHER_FIELDS = ("temp", "feels_like", "humidity", "wind_speed", "uv_index", "precip_prob", "forecast_aqi_24h")
+
+
+def _record(row: dict) -> dict:
+    return {
+        "city_id": int(row.get("city_id", 0) or 0),
+        "station_id": int(row.get("station_id", 0) or 0),
+        "city": str(row.get("city", "")),
+        "aqi": int(row.get("aqi", 0) or 0),
+        "pm25": float(row.get("pm25") or 0.0),
+        "pm10": float(row.get("pm10") or 0.0),
+        "no2": float(row.get("no2") or 0.0),
+        "o3": float(row.get("o3") or 0.0),
+        "co": float(row.get("co") or 0.0),
+        "so2": float(row.get("so2") or 0.0),
+        "health_category": str(row.get("health_category", "")),
+        "temp": float(row.get("temp") or 0.0),
+        "feels_like": float(row.get("feels_like") or 0.0),
+        "humidity": int(row.get("humidity", 0) or 0),
+        "wind_speed": float(row.get("wind_speed") or 0.0),
+        "uv_index": float(row.get("uv_index") or 0.0),
+        "precip_prob": int(row.get("precip_prob", 0) or 0),
+        "forecast_aqi_24h": row.get("forecast_aqi_24h") or "[]",
+        "lat": float(row.get("lat") or 0.0),
+        "lon": float(row.get("lon") or 0.0),
+        "recorded_at": str(row.get("recorded_at") or ""),
+    }
+
+
+class RedisPublisherObserver(pw.io.python.ConnectorObserver):
+    def __init__(self, redis_client, stream_key: str, stream_maxlen: int, max_queued: int = 8):
+        self.r = redis_client
+        self.stream_key = stream_key
+        self.stream_maxlen = stream_maxlen
+        # Per-city /summary and /stations documents; only the writer thread touches it
+        self.summaries = CitySummaryBuilder()
+        self._batch = {}                    # station_id -> record, for the current commit
+        self._weather = {}                  # city_id -> weather fields, for the current commit
+        self._published = {}                # station_id -> station fields last published
+        self._published_weather = {}        # city_id -> weather fields last published
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._writer = threading.Thread(target=self._run, name="redis-publisher", daemon=True)
+        self._writer.start()
+
+    def on_change(self, key, row, time, is_addition):
+        if is_addition:
+            record = _record(row)
+            station = {k: v for k, v in record.items() if k not in WEATHER_FIELDS}
+            weather = {f: record[f] for f in WEATHER_FIELDS}
+            if self._published.get(record["station_id"]) != station:
+                self._published[record["station_id"]] = station
+                self._batch[record["station_id"]] = record
+            elif self._published_weather.get(record["city_id"]) != weather:
+                # Only the joined weather changed
+                self._weather[record["city_id"]] = weather
+            self._published_weather[record["city_id"]] = weather
+
+    def on_time_end(self, time):
+        if self._batch or self._weather:
+            batch, self._batch = self._batch, {}
+            weather, self._weather = self._weather, {}
+            self._queue.put((list(batch.values()), weather))
+
+    def on_end(self):
+        self.on_time_end(None)
+        self._queue.put(None)
+        self._writer.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            records, weather = item
+            try:
+                self._publish(records, weather)
+            except Exception as e:
+                print(f"Failed to publish {len(records)} reading(s) and {len(weather)} weather update(s) to redis: {e}")
+
+    def _publish(self, records: list, weather_updates: dict):
+        # Global, monotonically increasing; clients sync with /changes?since=seq.
+        # One number per station reading and per city weather change.
+        count = len(records) + len(weather_updates)
+        seqs = itertools.count(self.r.incrby("aqi:seq", count) - count + 1)
+        published_at = datetime.now(timezone.utc).timestamp()
+        pipe = self.r.pipeline(transaction=False)
+        weather = {}
+        for record in records:
+            record["published_at"] = published_at
+            record["seq"] = next(seqs)
+            data = json.dumps(record)
+            # Capped stream for real-time broadcast; API workers replay it after a restart
+            pipe.xadd(self.stream_key, {"data": data}, maxlen=self.stream_maxlen, approximate=True)
+            pipe.setex(f'station:{record["station_id"]}:latest', TTL_S, data)
+            weather[record["city_id"]] = {"city_id": record["city_id"],
+                                          **{f: record[f] for f in WEATHER_FIELDS}, "seq": record["seq"]}
+            self.summaries.update(record)
+        for city_id, w in weather_updates.items():
+            event = {"type": "weather", "city_id": city_id, **w,
+                     "published_at": published_at, "seq": next(seqs)}
+            pipe.xadd(self.stream_key, {"data": json.dumps(event)}, maxlen=self.stream_maxlen, approximate=True)
+            weather[city_id] = {"city_id": city_id, **w, "seq": event["seq"]}
+            # Readers of station:{id}:latest see the new weather too; XX/KEEPTTL so
+            # an expired reading stays expired and a live one doesn't live longer
+            for record in self.summaries.update_weather(city_id, w):
+                pipe.set(f'station:{record["station_id"]}:latest', json.dumps(record), xx=True, keepttl=True)
+        for city_id, w in weather.items():
+            pipe.setex(f"weather:{city_id}", TTL_S, json.dumps(w))
+            if not self.summaries.latest[city_id]:
+                continue
+            # Ready-to-send city documents; the API returns these bytes as-is
+            summary, stations = self.summaries.render(city_id)
+            pipe.hset(f"city:{city_id}:docs", mapping={"summary": summary, "stations": stations})
+            pipe.hincrby(f"city:{city_id}:docs", "version", 1)
+            pipe.expire(f"city:{city_id}:docs", TTL_S)
+        pipe.execute()
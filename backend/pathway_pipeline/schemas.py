@@ -1,8 +1,9 @@
 import pathway as pw
 
+# Keyed: the connectors upsert, so each table holds the latest row per key
 class StationAQISchema(pw.Schema):
     city_id: int
-    station_id: int
+    station_id: int = pw.column_definition(primary_key=True)
     city: str
     aqi: float
     pm25: float
@@ -16,7 +17,7 @@ class StationAQISchema(pw.Schema):
     timestamp: str
 
 class WeatherSchema(pw.Schema):
-    city_id: int
+    city_id: int = pw.column_definition(primary_key=True)
     city: str
     lat: float
     lon: float
@@ -28,3 +29,5 @@ class WeatherSchema(pw.Schema):
     precip_prob: int
     forecast_aqi_24h: str
     timestamp: str
+    # When this row was fetched (UTC ISO-8601); Open-Meteo's own time is local
+    fetched_at: str
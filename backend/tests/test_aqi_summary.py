@@ -0,0 +1,23 @@
+from pathway_pipeline.aqi_summary import city_summary, classify_aqi
+
+
+def test_classify_aqi_boundaries():
+    assert classify_aqi(50) == "Good"
+    assert classify_aqi(50.5) == "Moderate"
+    assert classify_aqi(150) == "Unhealthy for Sensitive Groups"
+    assert classify_aqi(200) == "Unhealthy"
+    assert classify_aqi(300) == "Very Unhealthy"
+    assert classify_aqi(301) == "Hazardous"
+
+
+def test_city_summary_averages_and_takes_weather_from_a_station_that_has_it():
+    readings = [
+        {"station_id": 1, "aqi": 90},
+        {"station_id": 2, "aqi": 121, "temp": 31.5, "humidity": 40, "forecast_aqi_24h": "[1]"},
+    ]
+    summary = city_summary(7, readings)
+    assert summary["aqi"] == 106 and summary["station_count"] == 2
+    assert summary["health_category"] == "Unhealthy for Sensitive Groups"
+    assert (summary["temp"], summary["humidity"], summary["wind_speed"]) == (31.5, 40, 0)
+    assert summary["forecast_aqi_24h"] == "[1]"
+    assert summary["stations"] is readings
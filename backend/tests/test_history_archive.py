@@ -0,0 +1,66 @@
+import asyncio
+import os
+from datetime import date, datetime, timezone
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from api.core.config import settings
+from api.services import history_archive
+from api.services.history_archive import archived_daily, archived_years
+
+TZ = "Asia/Kolkata"
+
+
+def _write(root, city_id, year, month, rows):
+    path = os.path.join(root, f"city_id={city_id}", f"year={year}", f"month={month}", "part-test.parquet")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.table({
+        "station_id": pa.array([1] * len(rows), pa.int32()),
+        "recorded_ts": pa.array([ts for ts, _ in rows], pa.timestamp("us", tz="UTC")),
+        "sample_count": pa.array([1] * len(rows), pa.int32()),
+        "aqi_avg": pa.array([float(a) for _, a in rows]),
+        "aqi_min": pa.array([float(a) for _, a in rows]),
+        "aqi_max": pa.array([float(a) for _, a in rows]),
+    })
+    pq.write_table(table, path)
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_ARCHIVE_DIR", str(tmp_path))
+    # January archived; February still in Postgres
+    _write(str(tmp_path), 7, 2024, 1, [
+        (datetime(2024, 1, 1, 2, tzinfo=timezone.utc), 100),     # 1 Jan 07:30 IST
+        (datetime(2024, 1, 15, 20, tzinfo=timezone.utc), 200),   # 16 Jan 01:30 IST
+        (datetime(2024, 1, 31, 20, tzinfo=timezone.utc), 300),   # 1 Feb 01:30 IST: Feb, not archived
+    ])
+    return tmp_path
+
+
+def test_days_are_local_to_the_city(archive):
+    days = asyncio.run(archived_daily(7, TZ, month=1))
+    assert [(d["day"], d["aqi_sum"]) for d in days] == [(date(2024, 1, 1), 100), (date(2024, 1, 16), 200)]
+
+
+def test_edge_rows_of_unarchived_months_are_left_to_postgres(archive):
+    assert asyncio.run(archived_daily(7, TZ, month=2)) == []
+    days = asyncio.run(archived_daily(7, TZ, date(2024, 1, 16), date(2024, 2, 28)))
+    assert [d["day"] for d in days] == [date(2024, 1, 16)]
+
+
+def test_local_month_start_is_read_from_previous_utc_month_file(archive):
+    # 1 Feb 00:30 IST lands in the January file; counts here once February is archived
+    _write(str(archive), 7, 2024, 2, [(datetime(2024, 2, 10, 6, tzinfo=timezone.utc), 50)])
+    days = asyncio.run(archived_daily(7, TZ, month=2))
+    assert [(d["day"], d["aqi_sum"]) for d in days] == [(date(2024, 2, 1), 300), (date(2024, 2, 10), 50)]
+    assert archived_years(7) == [2024]
+
+
+def test_without_archive_returns_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_ARCHIVE_DIR", str(tmp_path))
+    assert asyncio.run(archived_daily(7, TZ)) == []
+    monkeypatch.setattr(history_archive, "pa", None)
+    assert asyncio.run(archived_daily(7, TZ, month=1)) == []
@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+from api.core.http_cache import data_version
+from api.services.live_state import LiveStationState
+
+
+def request_with(state):
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(live_state=state, redis=None)))
+
+
+def weather_event(seq, temp):
+    return {"type": "weather", "city_id": 1, "temp": temp, "seq": seq}
+
+
+def test_weather_change_changes_the_weather_etags_only():
+    state = LiveStationState()
+    state.update({"station_id": 10, "city_id": 1, "aqi": 90, "temp": 20.0, "seq": 1})
+    request = request_with(state)
+
+    def versions():
+        return [asyncio.run(data_version(request, c, weather=w)) for c, w in
+                [(1, False), (1, True), (None, True)]]
+
+    before = versions()
+    assert before == ["c1-1", "c1-1-w1", "all-1-w1"]
+    state.update(weather_event(2, 35.0))
+    after = versions()
+    assert after[0] == before[0]                # /stations doesn't include weather
+    assert after[1] != before[1] and after[2] != before[2]
+    state.update(weather_event(3, 35.0))        # same weather again: same tag
+    assert versions()[1] == after[1]
@@ -0,0 +1,60 @@
+import asyncio
+
+from api.services.live_state import LiveStationState
+from api.services.redis_bridge import LiveUpdateCoalescer
+from pathway_pipeline.aqi_summary import city_summary
+
+
+def reading(station_id, seq, **fields):
+    return {"station_id": station_id, "city_id": 1, "aqi": 100, "pm25": 40.0,
+            "temp": 20.0, "humidity": 50, "seq": seq, **fields}
+
+
+def weather_event(seq, temp):
+    return {"type": "weather", "city_id": 1, "temp": temp, "feels_like": temp, "humidity": 30,
+            "wind_speed": 3.0, "uv_index": 5.0, "precip_prob": 0, "forecast_aqi_24h": "[]", "seq": seq}
+
+
+def test_weather_event_updates_city_weather_and_station_records():
+    state = LiveStationState()
+    state.update(reading(10, 1))
+    state.update(reading(11, 2))
+    state.update(weather_event(3, 35.0))
+
+    assert state.weather[1]["temp"] == 35.0
+    assert state.head_seq == 3
+    readings = state.city_readings(1)
+    assert {r["temp"] for r in readings} == {35.0}
+    assert city_summary(1, readings)["temp"] == 35.0
+    # The readings themselves didn't change: delta sync sends only the weather
+    assert state.changes_since(2) == []
+    assert [w["temp"] for w in state.weather_since(2)] == [35.0]
+    assert state.weather_since(3) == []
+
+
+def test_weather_event_for_a_city_without_readings():
+    state = LiveStationState()
+    state.update(weather_event(5, 12.0))
+    assert state.weather[1]["temp"] == 12.0 and state.city_readings(1) is None
+
+
+class FakeSio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+
+def test_coalescer_sends_weather_to_the_city_room():
+    sio = FakeSio()
+    coalescer = LiveUpdateCoalescer(sio)
+    coalescer.add(reading(10, 1))
+    coalescer.add(weather_event(2, 30.0))
+    coalescer.add(weather_event(3, 31.0))
+    asyncio.run(coalescer.flush())
+
+    weather = [(data, to) for event, data, to in sio.emitted if event == "aqi_weather"]
+    assert weather == [({"city_id": 1, "weather": weather_event(3, 31.0)}, "city:1")]
+    batches = [data for event, data, _ in sio.emitted if event == "aqi_batch"]
+    assert [u["station_id"] for u in batches[0]["updates"]] == [10]
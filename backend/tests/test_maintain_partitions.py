@@ -0,0 +1,142 @@
+import os
+import uuid
+from datetime import date
+
+import psycopg2
+import pytest
+
+import maintain_partitions
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if "history_partitions_before" in sql:
+            self._rows = [(p,) for p in self.conn.old]
+        if "DETACH PARTITION" in sql:
+            # What Postgres does for station_aqi_history, which always has a default partition
+            if "CONCURRENTLY" in sql:
+                raise psycopg2.errors.FeatureNotSupported(
+                    "cannot detach partitions concurrently when a default partition exists"
+                )
+            if self.conn.busy:
+                self.conn.busy -= 1
+                raise psycopg2.errors.LockNotAvailable("canceling statement due to lock timeout")
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeConn:
+    """Enough of a psycopg2 connection: `with conn` commits or rolls back."""
+
+    def __init__(self, old, busy=0):
+        self.old = old
+        self.busy = busy
+        self.autocommit = True
+        self.statements = []
+        self.commits = self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def __enter__(self):
+        assert not self.autocommit, "SET LOCAL needs a transaction"
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type:
+            self.rollbacks += 1
+        else:
+            self.commits += 1
+        return False
+
+
+def test_retention_detaches_without_concurrently_when_default_partition_exists():
+    conn = FakeConn(["station_aqi_history_y2023m01", "station_aqi_history_y2023m02"])
+    done = maintain_partitions.apply_retention(conn, date(2023, 3, 1), "drop", sleep=lambda s: None)
+
+    assert done == conn.old
+    detaches = [s for s in conn.statements if "DETACH" in s]
+    assert len(detaches) == 2 and not any("CONCURRENTLY" in s for s in detaches)
+    assert sum("lock_timeout" in s for s in conn.statements) == 2
+    assert 'DROP TABLE "station_aqi_history_y2023m01"' in conn.statements
+    # One transaction for the listing, one per partition
+    assert conn.commits == 3
+
+
+def test_retention_archive_mode_moves_partitions_to_schema():
+    conn = FakeConn(["station_aqi_history_y2023m01"])
+    maintain_partitions.apply_retention(conn, date(2023, 2, 1), "archive", sleep=lambda s: None)
+
+    assert "CREATE SCHEMA IF NOT EXISTS history_archive" in conn.statements
+    assert 'ALTER TABLE "station_aqi_history_y2023m01" SET SCHEMA history_archive' in conn.statements
+    assert not any(s.startswith("DROP TABLE") for s in conn.statements)
+
+
+def test_retention_retries_on_lock_timeout_and_gives_up():
+    waits = []
+    conn = FakeConn(["station_aqi_history_y2023m01"], busy=2)
+    assert maintain_partitions.apply_retention(conn, date(2023, 2, 1), "drop", sleep=waits.append) == conn.old
+    assert waits == [10, 20] and conn.rollbacks == 2
+
+    conn = FakeConn(["station_aqi_history_y2023m01"], busy=99)
+    assert maintain_partitions.apply_retention(conn, date(2023, 2, 1), "drop", sleep=lambda s: None) == []
+    assert not any(s.startswith("DROP TABLE") for s in conn.statements)
+
+
+# ── Against a real server ─────────────────────────────────────────────────────
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+SCHEMA_SQL = """
+    CREATE TABLE station_aqi_history (id SERIAL, recorded_ts TIMESTAMPTZ NOT NULL, aqi FLOAT8)
+        PARTITION BY RANGE (recorded_ts);
+    CREATE TABLE station_aqi_history_y2023m01 PARTITION OF station_aqi_history
+        FOR VALUES FROM ('2023-01-01 00:00+00') TO ('2023-02-01 00:00+00');
+    CREATE TABLE station_aqi_history_y2023m02 PARTITION OF station_aqi_history
+        FOR VALUES FROM ('2023-02-01 00:00+00') TO ('2023-03-01 00:00+00');
+    CREATE TABLE station_aqi_history_default PARTITION OF station_aqi_history DEFAULT;
+    INSERT INTO station_aqi_history (recorded_ts, aqi) VALUES ('2023-01-15', 10), ('2023-02-15', 20), ('2030-01-01', 30);
+    CREATE FUNCTION history_partitions_before(p_before DATE)
+    RETURNS TABLE (partition_name TEXT, month DATE) AS $$
+        SELECT c.relname::text, to_date(right(c.relname, 8), '"y"YYYY"m"MM')
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'station_aqi_history'::regclass
+          AND c.relname ~ '^station_aqi_history_y[0-9]{4}m[0-9]{2}$'
+          AND to_date(right(c.relname, 8), '"y"YYYY"m"MM') + INTERVAL '1 month' <= p_before
+        ORDER BY 2;
+    $$ LANGUAGE sql STABLE;
+"""
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+def test_retention_against_postgres_with_default_partition():
+    schema = f"t_retention_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    try:
+        conn = psycopg2.connect(TEST_DATABASE_URL, options=f"-c search_path={schema}")
+        with conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_SQL)
+        done = maintain_partitions.apply_retention(conn, date(2023, 2, 1), "drop", sleep=lambda s: None)
+        assert done == ["station_aqi_history_y2023m01"]
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT aqi FROM station_aqi_history ORDER BY aqi")
+            assert [r[0] for r in cur.fetchall()] == [20, 30]
+            cur.execute("SELECT to_regclass('station_aqi_history_y2023m01')")
+            assert cur.fetchone()[0] is None
+        conn.close()
+    finally:
+        admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
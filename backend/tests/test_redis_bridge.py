@@ -0,0 +1,64 @@
+import asyncio
+
+import redis.asyncio as aioredis
+
+from api.services import redis_bridge
+from api.services.redis_bridge import StreamFollower
+
+
+class FakeStreamRedis:
+    """Just enough of XINFO STREAM / XREVRANGE for the follower's trim check."""
+
+    def __init__(self, entry_ids, max_deleted="0-0", redis7=True):
+        self.entry_ids = entry_ids
+        self.max_deleted = max_deleted
+        self.redis7 = redis7
+
+    async def xinfo_stream(self, key):
+        if not self.entry_ids and self.max_deleted == "0-0":
+            raise aioredis.ResponseError("no such key")
+        info = {"first-entry": (self.entry_ids[0], {}) if self.entry_ids else None}
+        if self.redis7:
+            info["max-deleted-entry-id"] = self.max_deleted
+        return info
+
+    async def xrevrange(self, key, count=None):
+        return [(self.entry_ids[-1], {})] if self.entry_ids else []
+
+
+def resync(follower, redis, monkeypatch):
+    loads = []
+
+    async def warm_load(state, r):
+        loads.append(state)
+
+    monkeypatch.setattr(redis_bridge, "warm_load", warm_load)
+    return asyncio.run(follower._resync_if_trimmed(redis)), loads
+
+
+def test_follower_within_the_stream_does_not_resync(monkeypatch):
+    follower = StreamFollower(live_state=object(), last_id="100-3")
+    redis = FakeStreamRedis(["100-2", "100-3", "101-0"], max_deleted="100-1")
+    assert resync(follower, redis, monkeypatch) == (False, [])
+    assert follower.last_id == "100-3"
+
+
+def test_follower_behind_the_trimmed_head_resyncs(monkeypatch):
+    state = object()
+    follower = StreamFollower(live_state=state, last_id="100-3")
+    # Same millisecond: only the sequence part shows the gap
+    redis = FakeStreamRedis(["100-5", "101-0"], max_deleted="100-4")
+    assert resync(follower, redis, monkeypatch) == (True, [state])
+    assert follower.last_id == "101-0"
+
+
+def test_new_stream_after_an_empty_start_is_not_a_gap(monkeypatch):
+    follower = StreamFollower(live_state=object(), last_id="0-0")
+    assert resync(follower, FakeStreamRedis([]), monkeypatch) == (False, [])
+    assert resync(follower, FakeStreamRedis(["200-0"]), monkeypatch) == (False, [])
+
+
+def test_first_entry_fallback_without_max_deleted_id(monkeypatch):
+    follower = StreamFollower(live_state=object(), last_id="100-0")
+    redis = FakeStreamRedis(["150-0"], redis7=False)
+    assert resync(follower, redis, monkeypatch)[0] is True
@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pathway_pipeline.connectors import scheduler
+from pathway_pipeline.connectors.scheduler import PollScheduler, TimingWheel, parse_observed
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda a, b: 1.0)
+
+
+def step_until_due(sched, clock, limit=100000):
+    """Seconds until the next key comes due, stepping the clock a tick at a time."""
+    for elapsed in range(1, limit + 1):
+        clock.now += 1
+        due = sched.due() if isinstance(sched, PollScheduler) else sched.advance()
+        if due:
+            return elapsed, due
+    raise AssertionError("nothing came due")
+
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+# ── TimingWheel ──────────────────────────────────────────────────────────────
+
+def test_wheel_returns_keys_in_deadline_order():
+    clock = FakeClock()
+    wheel = TimingWheel(clock=clock)
+    wheel.schedule("c", 30)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 12)
+    assert len(wheel) == 3 and "a" in wheel
+
+    assert step_until_due(wheel, clock) == (5, ["a"])
+    assert step_until_due(wheel, clock) == (7, ["b"])
+    assert step_until_due(wheel, clock) == (18, ["c"])
+    assert len(wheel) == 0
+
+
+def test_wheel_holds_keys_beyond_one_revolution_for_extra_rounds():
+    clock = FakeClock()
+    wheel = TimingWheel(slots=64, clock=clock)
+    wheel.schedule("far", 200)
+    wheel.schedule("near", 200 - 64)            # same bucket, one round earlier
+    assert wheel._where["far"] == wheel._where["near"]
+
+    assert step_until_due(wheel, clock) == (136, ["near"])
+    assert step_until_due(wheel, clock) == (64, ["far"])
+
+
+def test_wheel_catches_up_after_a_stall():
+    clock = FakeClock()
+    wheel = TimingWheel(slots=16, clock=clock)
+    for i in range(10):
+        wheel.schedule(i, i * 3)
+    clock.now += 100                            # several revolutions without a tick
+    assert sorted(wheel.advance()) == list(range(10))
+
+
+def test_wheel_reschedule_and_cancel():
+    clock = FakeClock()
+    wheel = TimingWheel(clock=clock)
+    wheel.schedule("a", 5)
+    wheel.schedule("a", 10)                     # replaces the earlier entry
+    wheel.schedule("b", 3)
+    wheel.cancel("b")
+    assert len(wheel) == 1
+    assert step_until_due(wheel, clock) == (10, ["a"])
+
+
+def test_parse_observed_requires_a_zone():
+    assert parse_observed("2026-01-01T10:00:00+05:30") == datetime(2026, 1, 1, 4, 30, tzinfo=timezone.utc)
+    assert parse_observed("2026-01-01T10:00:00") is None
+    assert parse_observed(None) is None
+
+
+# ── PollScheduler ────────────────────────────────────────────────────────────
+
+def make_scheduler(clock, **kwargs):
+    kwargs.setdefault("interval", 600)
+    return PollScheduler(wheel=TimingWheel(clock=clock), **kwargs)
+
+
+def test_sync_spreads_new_keys_over_one_interval():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=60)
+    sched.sync({1: "s1", 2: "s2", 3: "s3"})
+    assert step_until_due(sched, clock) == (1, ["s1"])
+    assert step_until_due(sched, clock) == (19, ["s2"])
+    assert step_until_due(sched, clock) == (20, ["s3"])
+
+
+def test_sync_drops_removed_keys():
+    clock = FakeClock()
+    sched = make_scheduler(clock)
+    sched.sync({1: "s1", 2: "s2"})
+    sched.sync({2: "s2"})
+    assert 1 not in sched.wheel and 1 not in sched._cadence
+    sched.reading(1, T0)                        # late result for a removed key: ignored
+    assert 1 not in sched.wheel
+
+
+def test_cadence_first_delta_replaces_guess_then_ewma():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=600, min_s=60, max_s=3600, alpha=0.3)
+    sched.sync({1: "s1"})
+    cadence = sched._cadence[1]
+
+    sched.reading(1, T0)                        # first observation: nothing to measure yet
+    assert cadence.interval == 600 and not cadence.measured
+    sched.reading(1, T0 + timedelta(seconds=1800))
+    assert cadence.interval == 1800 and cadence.measured
+    sched.reading(1, T0 + timedelta(seconds=1800 + 3600))
+    assert cadence.interval == pytest.approx(0.3 * 3600 + 0.7 * 1800)
+    sched.wheel.cancel(1)
+    sched.reading(1, T0 + timedelta(seconds=1800 + 3600 + 900))
+    assert step_until_due(sched, clock)[0] == pytest.approx(cadence.interval, abs=1)
+
+
+def test_cadence_is_clamped():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=600, min_s=60, max_s=3600)
+    sched.sync({1: "s1", 2: "s2"})
+    sched.reading(1, T0)
+    sched.reading(1, T0 + timedelta(seconds=5))
+    assert sched._cadence[1].interval == 60
+    sched.reading(2, T0)
+    sched.reading(2, T0 + timedelta(days=1))
+    assert sched._cadence[2].interval == 3600
+
+
+def test_repeated_reading_backs_off_from_a_quarter_cadence_to_offline():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=3600, min_s=60, max_s=3600, offline_s=21600)
+    sched.sync({1: "s1"})
+    sched.reading(1, T0)
+    sched.wheel.cancel(1)
+
+    delays = []
+    for _ in range(6):
+        sched.reading(1, T0)
+        delays.append(step_until_due(sched, clock)[0])
+    assert delays == [900, 1800, 3600, 7200, 14400, 21600]
+    assert sched.offline_count() == 1
+
+    sched.reading(1, T0 + timedelta(hours=1))   # a new reading clears the backoff
+    assert sched._cadence[1].repeats == 0 and sched.offline_count() == 0
+
+
+def test_failures_back_off_exponentially_up_to_offline():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=600, min_s=60, max_s=600, offline_s=1000)
+    sched.sync({1: "s1"})
+    sched.wheel.cancel(1)
+
+    delays = []
+    for _ in range(5):
+        sched.failed(1)
+        delays.append(step_until_due(sched, clock)[0])
+    assert delays == [120, 240, 480, 960, 1000]
+    assert sched.offline_count() == 1
+    sched.reading(1)
+    assert sched.offline_count() == 0
+
+
+def test_non_adaptive_repeats_every_interval():
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=300, adaptive=False)
+    sched.sync({1: "s1"})
+    sched.wheel.cancel(1)
+    sched.reading(1, T0)
+    sched.reading(1, T0)
+    assert step_until_due(sched, clock)[0] == 300
+
+
+def test_jitter_is_at_most_ten_percent(monkeypatch):
+    clock = FakeClock()
+    sched = make_scheduler(clock, interval=1000, min_s=60)
+    sched.sync({1: "s1"})
+    sched.wheel.cancel(1)
+    monkeypatch.setattr(scheduler.random, "uniform", lambda a, b: b)
+    sched.reading(1)
+    assert step_until_due(sched, clock)[0] == 1100
@@ -0,0 +1,280 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from pathway_pipeline.connectors.upstream import (
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    CircuitOpenError,
+    TokenBucket,
+    UpstreamClient,
+    UpstreamError,
+)
+
+
+class FakeClock:
+    """Injectable clock; sleeping advances it instantly and is recorded."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, s):
+        self.sleeps.append(s)
+        self.now += s
+
+
+# ── Stub upstream ────────────────────────────────────────────────────────────
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Each path answers with the next status from its script (the last one repeats)."""
+
+    scripts = {}
+    hits = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        n = self.hits.get(path, 0)
+        self.hits[path] = n + 1
+        script = self.scripts.get(path, [(200, {})])
+        status, headers = script[min(n, len(script) - 1)]
+        if status == "hang":
+            time.sleep(2)
+            status, headers = 200, {}
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"status":"ok"}')
+
+
+@pytest.fixture
+def stub():
+    StubHandler.scripts, StubHandler.hits = {}, {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", StubHandler
+    server.shutdown()
+    server.server_close()
+
+
+def run(coro_fn):
+    async def main():
+        async with httpx.AsyncClient() as client:
+            return await coro_fn(client)
+    return asyncio.run(main())
+
+
+# ── Token bucket ─────────────────────────────────────────────────────────────
+
+def test_token_bucket_allows_burst_then_paces_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    asyncio.run(take(3))
+    assert clock.sleeps == []
+    asyncio.run(take(4))
+    # 4 more tokens at 2/s after an empty bucket
+    assert sum(clock.sleeps) == pytest.approx(2.0)
+
+
+def test_client_paces_requests_per_host(stub):
+    base, _ = stub
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, rate_per_s=10, burst=1, clock=clock, sleep=clock.sleep)
+        await asyncio.gather(*[upstream.get(f"{base}/ok") for _ in range(5)])
+
+    run(go)
+    assert clock.now - 1000.0 == pytest.approx(0.4)
+
+
+# ── AIMD concurrency ─────────────────────────────────────────────────────────
+
+def test_concurrency_grows_on_fast_successes():
+    limiter = AdaptiveConcurrency(initial=4, max_limit=6, clock=FakeClock())
+    for _ in range(4):
+        limiter._adjust(0.1, True)
+    assert limiter.limit == pytest.approx(5.0, abs=0.1)
+    for _ in range(100):
+        limiter._adjust(0.1, True)
+    assert limiter.limit == 6
+
+
+def test_concurrency_halves_on_errors_and_slow_responses_once_per_cooldown():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrency(initial=16, cooldown_s=1.0, clock=clock)
+    limiter._adjust(0.1, True)                  # baseline 0.1s
+    start = limiter.limit
+
+    limiter._adjust(None, False)                # error
+    assert limiter.limit == pytest.approx(start / 2)
+    limiter._adjust(None, False)                # same window: no second cut
+    assert limiter.limit == pytest.approx(start / 2)
+
+    clock.now += 1.0
+    limiter._adjust(0.5, True)                  # 5x baseline: too slow
+    assert limiter.limit == pytest.approx(start / 4)
+
+    for _ in range(10):
+        clock.now += 1.0
+        limiter._adjust(None, False)
+    assert limiter.limit == limiter.min_limit
+
+
+def test_concurrency_limit_bounds_inflight_requests():
+    limiter = AdaptiveConcurrency(initial=2, clock=FakeClock())
+    peak = 0
+
+    async def worker():
+        nonlocal peak
+        await limiter.acquire()
+        peak = max(peak, limiter.inflight)
+        await asyncio.sleep(0.01)
+        await limiter.release(0.01, True)
+
+    async def main():
+        await asyncio.gather(*[worker() for _ in range(8)])
+
+    asyncio.run(main())
+    assert peak <= 3 and limiter.inflight == 0
+
+
+# ── Retries ──────────────────────────────────────────────────────────────────
+
+def test_429_is_retried_after_retry_after(stub):
+    base, handler = stub
+    handler.scripts["/limited"] = [(429, {"Retry-After": "3"}), (200, {})]
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, clock=clock, sleep=clock.sleep)
+        return await upstream.get(f"{base}/limited"), upstream
+
+    resp, upstream = run(go)
+    assert resp.status_code == 200
+    assert handler.hits["/limited"] == 2
+    assert 3 in clock.sleeps
+    assert upstream.stats()[f"{base[7:]}:retries"] == 1
+
+
+def test_5xx_retries_with_bounded_jitter_then_returns_last_response(stub):
+    base, handler = stub
+    handler.scripts["/down"] = [(503, {})]
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, retries=2, backoff_s=0.5, clock=clock, sleep=clock.sleep)
+        return await upstream.get(f"{base}/down")
+
+    resp = run(go)
+    assert resp.status_code == 503 and handler.hits["/down"] == 3
+    assert len(clock.sleeps) == 2
+    assert all(0 <= s <= 0.5 * 2 ** i for i, s in enumerate(clock.sleeps))
+
+
+def test_4xx_is_returned_without_retry(stub):
+    base, handler = stub
+    handler.scripts["/missing"] = [(404, {})]
+
+    async def go(client):
+        clock = FakeClock()
+        return await UpstreamClient(client, clock=clock, sleep=clock.sleep).get(f"{base}/missing")
+
+    assert run(go).status_code == 404 and handler.hits["/missing"] == 1
+
+
+def test_transport_error_raises_after_retries():
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, retries=1, clock=clock, sleep=clock.sleep)
+        with pytest.raises(UpstreamError):
+            await upstream.get("http://127.0.0.1:1/x")
+
+    run(go)
+
+
+# ── Circuit breaker ──────────────────────────────────────────────────────────
+
+def test_breaker_closed_open_half_open_closed():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_s=30, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        assert not breaker.failure()
+    assert breaker.failure() and breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()                  # one probe at a time
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_s=10, clock=clock)
+    breaker.failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.failure() and breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_client_breaker_transitions_against_stub(stub):
+    base, handler = stub
+    handler.scripts["/flaky"] = [(503, {})] * 3 + [(200, {})]
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, retries=0, failure_threshold=3, reset_s=30,
+                                  clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            assert (await upstream.get(f"{base}/flaky")).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await upstream.get(f"{base}/flaky")
+        assert handler.hits["/flaky"] == 3       # rejected without a request
+        clock.now += 30
+        assert (await upstream.get(f"{base}/flaky")).status_code == 200
+        return upstream.stats()[f"{base[7:]}:circuit"]
+
+    assert run(go) == CircuitBreaker.CLOSED
+
+
+def test_cancelled_probe_releases_the_half_open_slot(stub):
+    base, handler = stub
+    handler.scripts["/probe"] = [(503, {}), ("hang", {}), (200, {})]
+    clock = FakeClock()
+
+    async def go(client):
+        upstream = UpstreamClient(client, retries=0, failure_threshold=1, reset_s=30,
+                                  clock=clock, sleep=clock.sleep)
+        await upstream.get(f"{base}/probe")
+        clock.now += 30
+        probe = asyncio.create_task(upstream.get(f"{base}/probe"))
+        await asyncio.sleep(0.2)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # Without releasing the slot this would raise CircuitOpenError forever
+        return (await upstream.get(f"{base}/probe")).status_code
+
+    assert run(go) == 200
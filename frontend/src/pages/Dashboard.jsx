@@ -46,7 +46,7 @@ export default function Dashboard() {
   const navigate = useNavigate();
   const {
     cities, setCities, selectedCityId, setSelectedCityId,
-    initSocket, liveUpdates, userProfile,
+    initSocket, subscribeCities, unsubscribeCities, liveUpdates, userProfile, cityCache,
     locationDetecting, detectAndSelectCity,
   } = useStore();
 
@@ -100,18 +100,16 @@ export default function Dashboard() {
     }
   }, [cities, userProfile]);
 
-  const loadCityData = useCallback(async (cityId) => {
+  const setters = { summary: setSummary, weather: setWeather, stations: setStations };
+
+  const loadCityData = useCallback(async (cityId, parts = Object.keys(setters)) => {
     if (!cityId) return;
     setLoading(true);
     try {
-      const [sumRes, weatherRes, stationRes] = await Promise.all([
-        fetch(`/api/aqi/cities/${cityId}/summary`),
-        fetch(`/api/aqi/cities/${cityId}/weather`),
-        fetch(`/api/aqi/cities/${cityId}/stations`),
-      ]);
-      if (sumRes.ok) { const d = await sumRes.json(); setSummary(d); }
-      if (weatherRes.ok) { const d = await weatherRes.json(); setWeather(d); }
-      if (stationRes.ok) { const d = await stationRes.json(); setStations(d); }
+      const responses = await Promise.all(parts.map((p) => fetch(`/api/aqi/cities/${cityId}/${p}`)));
+      for (const [i, res] of responses.entries()) {
+        if (res.ok) setters[parts[i]](await res.json());
+      }
       setLastUpdated(new Date());
     } catch (e) {
       console.error('Failed to load city data', e);
@@ -120,10 +118,36 @@ export default function Dashboard() {
     }
   }, []);
 
+  // The server pushes the city's snapshot when we join its room; REST is only
+  // the fallback when no snapshot arrives (socket down) or parts are missing
+  const snapshotFallbackRef = useRef(null);
   useEffect(() => {
-    loadCityData(selectedCityId);
+    if (!selectedCityId) return;
+    setLoading(true);
+    subscribeCities([selectedCityId], { snapshot: true });
+    snapshotFallbackRef.current = setTimeout(() => loadCityData(selectedCityId), 3000);
+    return () => {
+      clearTimeout(snapshotFallbackRef.current);
+      unsubscribeCities([selectedCityId]);
+    };
   }, [selectedCityId]);
 
+  const snapshot = cityCache[selectedCityId];
+  useEffect(() => {
+    if (!snapshot?.snapshotAt) return;
+    clearTimeout(snapshotFallbackRef.current);
+    const missing = Object.keys(setters).filter((p) => !snapshot[p]);
+    for (const p of Object.keys(setters)) if (snapshot[p]) setters[p](snapshot[p]);
+    setLastUpdated(new Date(snapshot.snapshotAt));
+    if (missing.length) loadCityData(selectedCityId, missing);
+    else setLoading(false);
+  }, [snapshot?.snapshotAt]);
+
+  // Live weather changes pushed for the selected city
+  useEffect(() => {
+    if (snapshot?.weatherAt) setWeather(snapshot.weather);
+  }, [snapshot?.weatherAt]);
+
   // Apply live Socket.IO updates to stations list
   const enrichedStations = stations.map((s) => {
     const live = liveUpdates[s.id];
@@ -49,9 +49,13 @@ function AQIMarker({ station, onClick }) {
 
 export default function Heatmap() {
   const { t } = useTranslation();
-  const { cities, setCities, selectedCityId, setSelectedCityId, initSocket, liveUpdates } = useStore();
+  const {
+    cities, setCities, selectedCityId, setSelectedCityId,
+    initSocket, subscribeCities, unsubscribeCities, liveUpdates,
+  } = useStore();
   const [searchParams] = useSearchParams();
 
+  const [snapshot, setSnapshot] = useState({}); // { [city_id]: { aqi, stations } }
   const [cityStations, setCityStations] = useState([]);
   const [mapCenter, setMapCenter] = useState(INDIA_CENTER);
   const [mapZoom, setMapZoom] = useState(INDIA_ZOOM);
@@ -63,14 +67,29 @@ export default function Heatmap() {
     if (cities.length === 0) {
       fetch('/api/aqi/cities').then((r) => r.json()).then(setCities).catch(() => {});
     }
+    // One bulk request for every city's stations + latest readings
+    fetch('/api/aqi/snapshot')
+      .then((r) => r.json())
+      .then((rows) => setSnapshot(Object.fromEntries(rows.map((c) => [c.city_id, c]))))
+      .catch(() => {});
   }, []);
 
+  // Country view shows every city, so follow live updates for all of them
+  useEffect(() => {
+    const ids = cities.map((c) => c.id);
+    subscribeCities(ids);
+    return () => unsubscribeCities(ids);
+  }, [cities]);
+
   // Drill into city stations + fetch community reports
   const drillIntoCity = async (city) => {
     setSelectedCityId(city.id);
-    const res = await fetch(`/api/aqi/cities/${city.id}/stations`);
-    if (!res.ok) return;
-    const data = await res.json();
+    let data = snapshot[city.id]?.stations;
+    if (!data) {
+      const res = await fetch(`/api/aqi/cities/${city.id}/stations`);
+      if (!res.ok) return;
+      data = await res.json();
+    }
     setCityStations(data.filter((s) => s.lat && s.lon));
     const validCity = cities.find((c) => c.id === city.id);
     if (validCity) {
@@ -93,22 +112,20 @@ export default function Heatmap() {
   useEffect(() => {
     const stationId = parseInt(searchParams.get('station'));
     if (stationId && cities.length > 0) {
-      cities.forEach(async (c) => {
-        const res = await fetch(`/api/aqi/cities/${c.id}/stations`);
-        if (!res.ok) return;
-        const stations = await res.json();
-        const found = stations.find((s) => s.id === stationId);
+      for (const c of Object.values(snapshot)) {
+        const found = c.stations.find((s) => s.id === stationId);
         if (found) {
-          setCityStations(stations.filter((s) => s.lat && s.lon));
+          setCityStations(c.stations.filter((s) => s.lat && s.lon));
           setMapCenter([found.lat, found.lon]);
           setMapZoom(13);
           setDrillMode(true);
           setSelectedStation(found);
-          setSelectedCityId(c.id);
+          setSelectedCityId(c.city_id);
+          break;
         }
-      });
+      }
     }
-  }, [searchParams, cities]);
+  }, [searchParams, cities, snapshot]);
 
   // Enrich city stations from live updates
   const enrichedStations = cityStations.map((s) => {
@@ -125,7 +142,7 @@ export default function Heatmap() {
       return {
         ...c,
         station_name: c.display_name,
-        aqi: liveStation?.aqi ?? null,
+        aqi: liveStation?.aqi ?? snapshot[c.id]?.aqi ?? null,
         lat: parseFloat(c.lat),
         lon: parseFloat(c.lon),
         _isCityMarker: true,
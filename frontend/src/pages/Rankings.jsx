@@ -80,7 +80,7 @@ function RankRow({ rank, row, tab }) {
 // ── Main page ─────────────────────────────────────────────────────────────────
 export default function Rankings() {
   const { t } = useTranslation();
-  const { liveUpdates } = useStore();
+  const { cities, setCities, initSocket, subscribeCities, unsubscribeCities, liveUpdates } = useStore();
 
   const TABS = [
     { key: 'hottest',  label: t('rankings.hottest'),  field: 'temp', sort: 'desc' },
@@ -114,6 +114,20 @@ export default function Rankings() {
     fetchAll();
   }, [fetchAll]);
 
+  // Rankings cover every city, so follow live updates for all of them
+  useEffect(() => {
+    initSocket();
+    if (cities.length === 0) {
+      fetch('/api/aqi/cities').then((r) => r.json()).then(setCities).catch(() => {});
+    }
+  }, []);
+
+  useEffect(() => {
+    const ids = cities.map((c) => c.id);
+    subscribeCities(ids);
+    return () => unsubscribeCities(ids);
+  }, [cities]);
+
   // Merge live Socket.IO updates into rows so rankings stay fresh
   const mergedWeather = useMemo(() => {
     if (!Object.keys(liveUpdates).length) return weatherRows;
@@ -135,15 +135,75 @@ const useStore = create((set, get) => ({
   liveUpdates: {},
   socket: null,
 
+  // Server only sends updates for subscribed cities; rooms are re-joined on reconnect.
+  // Cities in snapshotCities also get their current state pushed on (re)join.
+  subscribedCities: [],
+  snapshotCities: [],
+
   initSocket: () => {
     if (get().socket) return;
-    const socket = io('/', { transports: ['websocket', 'polling'] });
-    socket.on('aqi_update', (data) => {
-      set((s) => ({ liveUpdates: { ...s.liveUpdates, [data.station_id]: data } }));
+    const socket = io('/', {
+      transports: ['websocket', 'polling'],
+      // Read on every (re)connect: the server joins these rooms and sends snapshots
+      auth: (cb) => cb({ city_ids: get().snapshotCities, snapshot: true }),
+    });
+    socket.on('connect', () => {
+      const { subscribedCities, snapshotCities } = get();
+      const rest = subscribedCities.filter((id) => !snapshotCities.includes(id));
+      if (rest.length) socket.emit('subscribe', { city_ids: rest });
+    });
+    // Current summary / stations / weather of a city, sent when its room is joined
+    socket.on('aqi_snapshot', ({ city_id, summary, stations, weather }) => {
+      set((s) => ({
+        cityCache: { ...s.cityCache, [city_id]: { ...s.cityCache[city_id], summary, stations, weather, snapshotAt: Date.now() } },
+      }));
+    });
+    // New weather for a subscribed city (station readings unchanged)
+    socket.on('aqi_weather', ({ city_id, weather }) => {
+      set((s) => ({
+        cityCache: { ...s.cityCache, [city_id]: { ...s.cityCache[city_id], weather, weatherAt: Date.now() } },
+      }));
+    });
+    // One frame per city per coalescing window, latest reading per station
+    socket.on('aqi_batch', ({ updates }) => {
+      set((s) => {
+        const next = { ...s.liveUpdates };
+        for (const u of updates) next[u.station_id] = u;
+        return { liveUpdates: next };
+      });
     });
     set({ socket });
   },
 
+  subscribeCities: (cityIds, { snapshot = false } = {}) => {
+    const ids = cityIds.filter((id) => id != null);
+    const current = get().subscribedCities;
+    const added = ids.filter((id) => !current.includes(id));
+    // A view asking for a snapshot needs one even if its city's room is already
+    // joined (e.g. by another view, or before a reconnect); joining again is harmless
+    const requested = snapshot ? ids : added;
+    if (!requested.length) return;
+    set((s) => ({
+      subscribedCities: [...s.subscribedCities, ...added],
+      snapshotCities: snapshot
+        ? [...s.snapshotCities, ...ids.filter((id) => !s.snapshotCities.includes(id))]
+        : s.snapshotCities,
+    }));
+    // Not connected yet: the connect handshake joins them and sends snapshots
+    const socket = get().socket;
+    if (socket?.connected) socket.emit('subscribe', { city_ids: requested, snapshot });
+  },
+
+  unsubscribeCities: (cityIds) => {
+    const removed = get().subscribedCities.filter((id) => cityIds.includes(id));
+    if (!removed.length) return;
+    get().socket?.emit('unsubscribe', { city_ids: removed });
+    set((s) => ({
+      subscribedCities: s.subscribedCities.filter((id) => !removed.includes(id)),
+      snapshotCities: s.snapshotCities.filter((id) => !removed.includes(id)),
+    }));
+  },
+
   destroySocket: () => {
     const socket = get().socket;
     if (socket) socket.disconnect();